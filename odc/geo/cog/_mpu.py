@@ -4,6 +4,7 @@ Multi-part upload as a graph
 
 from __future__ import annotations
 
+import os
 from functools import partial
 from typing import (
     TYPE_CHECKING,
@@ -27,13 +28,41 @@ __all__ = [
     "PartsWriter",
     "MPUChunk",
     "mpu_write",
+    "default_spill_sz",
 ]
 
-SomeData = Union[bytes, bytearray]
+SomeData = Union[bytes, bytearray, memoryview]
+
+
+def default_spill_sz(default: int = 20 * (1 << 20)) -> int:
+    """
+    Spill size to use when one was not supplied explicitly.
+
+    Smaller spill size releases memory sooner, but does not produce more parts:
+    part ids are preallocated per dask partition (``writes_per_chunk`` each),
+    once those are used up remaining data stays buffered until it is merged
+    with a neighbouring partition. Override the backend ``default`` with
+    ``ODC_MPU_SPILL_SZ`` environment variable (in bytes).
+    """
+    spill_sz = os.environ.get("ODC_MPU_SPILL_SZ", "")
+    if not spill_sz:
+        return default
+    try:
+        return int(spill_sz)
+    except ValueError:
+        raise ValueError(
+            f"ODC_MPU_SPILL_SZ must be an integer number of bytes, got {spill_sz!r}"
+        ) from None
 
 
 class PartsWriter(Protocol):
-    """Protocol for labeled parts data writer."""
+    """
+    Protocol for labeled parts data writer.
+
+    Writers can optionally provide ``put(data)`` and ``put_limit``. Output that
+    was never split into parts and is at most ``put_limit`` bytes is then
+    written with a single ``put`` call instead of ``write`` + ``finalise``.
+    """
 
     def __call__(self, part: int, data: SomeData) -> Dict[str, Any]: ...
 
@@ -115,6 +144,8 @@ class MPUChunk:
         return s
 
     def append(self, data: SomeData, chunk_id: Any = None):
+        # accept any contiguous buffer (e.g. numpy array), size is in bytes
+        data = memoryview(data).cast("B")
         sz = len(data)
         self.observed.append((sz, chunk_id))
         self.data += data
@@ -176,7 +207,7 @@ class MPUChunk:
 
             _data = data
             if not self.started_write and self.lhs_keep > 0:
-                self.left_data = bytearray(_data[: self.lhs_keep])
+                self.left_data = _data[: self.lhs_keep]
                 _data = data[self.lhs_keep :]
 
             part = pw(self.nextPartId, _data)
@@ -225,9 +256,12 @@ class MPUChunk:
         rr = None
         if not self.started_write:
             assert not self.left_data
-            # TODO: special case this code path
-            partId = self.nextPartId if leftPartId is None else leftPartId
             spill_data = self.data
+            if finalise and len(spill_data) <= getattr(write, "put_limit", -1):
+                self.data = bytearray()
+                return len(spill_data), write.put(spill_data)  # type: ignore
+
+            partId = self.nextPartId if leftPartId is None else leftPartId
             self.parts.append(write(partId, spill_data))
             self.data = bytearray()
 
@@ -265,14 +299,14 @@ class MPUChunk:
         if bytes_to_write < spill_sz:
             return 0
 
-        if lhs_keep == 0:
-            spill_data = self.data[:bytes_to_write]
-            self.data = bytearray(self.data[bytes_to_write:])
-        else:
-            spill_data = self.data[lhs_keep : lhs_keep + bytes_to_write]
+        # Only copy the bytes we keep, spill buffer is truncated in place
+        spill_data = self.data
+        self.data = spill_data[lhs_keep + bytes_to_write :]
+        del spill_data[lhs_keep + bytes_to_write :]
+        if lhs_keep > 0:
             assert not self.left_data
-            self.left_data = bytearray(self.data[:lhs_keep])
-            self.data = bytearray(self.data[bytes_to_write + lhs_keep :])
+            self.left_data = spill_data[:lhs_keep]
+            del spill_data[:lhs_keep]
 
         assert len(spill_data) == bytes_to_write
         assert len(spill_data) >= spill_sz
@@ -369,13 +403,15 @@ def mpu_write(
     mk_footer: Any = None,
     user_kw: dict[str, Any] | None = None,
     writes_per_chunk: int = 1,
-    spill_sz: int = 20 * (1 << 20),
+    spill_sz: int | None = None,
     dask_name_prefix="mpufinalise",
 ) -> "Delayed":
     # pylint: disable=import-outside-toplevel,too-many-locals,too-many-arguments
     from dask.base import tokenize
     from dask.delayed import delayed
 
+    if spill_sz is None:
+        spill_sz = default_spill_sz()
     if not isinstance(chunks, list):
         chunks = [chunks]
     if write is None:
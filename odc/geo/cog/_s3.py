@@ -4,17 +4,29 @@ S3 utils for COG to S3.
 
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
+from io import RawIOBase
 from threading import Lock
-from typing import TYPE_CHECKING, Any, Optional, Tuple
-
-from cachetools import cached
-
-from ._mpu import PartsWriter, SomeData, mpu_write
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Hashable,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from cachetools import LRUCache, cached
+from cachetools.keys import hashkey
+
+from ._mpu import PartsWriter, SomeData, default_spill_sz, mpu_write
 
 if TYPE_CHECKING:
     import dask.bag
     import distributed
-    from botocore.credentials import ReadOnlyCredentials
+    from botocore.credentials import ReadOnlyCredentials, RefreshableCredentials
     from dask.delayed import Delayed
 
 _state: dict[str, Any] = {}
@@ -51,26 +63,135 @@ class S3Limits:
     Common S3 writer settings
     """
 
-    @property
-    def min_write_sz(self) -> int:
-        return 5 * (1 << 20)
+    min_write_sz: int = 5 * (1 << 20)
+    max_write_sz: int = 5 * (1 << 30)
+    min_part: int = 1
+    max_part: int = 10_000
 
-    @property
-    def max_write_sz(self) -> int:
-        return 5 * (1 << 30)
 
-    @property
-    def min_part(self) -> int:
-        return 1
+class _BufferReader(RawIOBase):
+    """Seekable read-only stream over a buffer, reads without copying it first."""
 
-    @property
-    def max_part(self) -> int:
-        return 10_000
+    def __init__(self, data: SomeData):
+        super().__init__()
+        self._data = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._data[self._pos : self._pos + len(buffer)]
+        n = len(chunk)
+        buffer[:n] = chunk
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._pos, len(self._data))[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _as_body(data: SomeData) -> Any:
+    # botocore takes bytes, bytearray or file-like objects, wrap other buffers
+    # (memoryview, numpy arrays) instead of copying them into bytes
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return _BufferReader(data)
+
+
+# botocore refreshes credentials 15 minutes before they expire, factories that
+# return ReadOnlyCredentials (no expiry) are re-queried this often
+_CREDS_TTL = timedelta(hours=1)
+
+
+def _refreshable_creds(factory: Callable[[], Any]) -> "RefreshableCredentials":
+    # pylint: disable=import-outside-toplevel,import-error
+    from botocore.credentials import RefreshableCredentials
+
+    def _fetch() -> dict[str, Any]:
+        creds = factory()
+        if isinstance(creds, Mapping):
+            # access_key, secret_key, token, expiry_time
+            return dict(creds)
+        expiry = datetime.now(timezone.utc) + _CREDS_TTL
+        return {
+            "access_key": creds.access_key,
+            "secret_key": creds.secret_key,
+            "token": creds.token,
+            "expiry_time": expiry.isoformat(),
+        }
+
+    return RefreshableCredentials.create_from_metadata(
+        metadata=_fetch(), refresh_using=_fetch, method="odc-geo-creds-factory"
+    )
+
+
+def _s3_client_key(
+    profile: Optional[str],
+    endpoint_url: Optional[str],
+    creds: Any,
+    creds_key: Hashable = None,
+):
+    # Never key on secret material, access key id is an identifier, not a secret.
+    # Factories come back as new objects after (cloud)pickling, so they are
+    # represented by the caller supplied creds_key instead.
+    if creds is None:
+        return hashkey(profile, endpoint_url, None)
+    if callable(creds):
+        return hashkey(profile, endpoint_url, "factory", creds_key)
+    return hashkey(profile, endpoint_url, creds.access_key)
+
+
+# Share client across all uploads (and unpickled copies) with same settings,
+# bounded so that rotated credentials don't keep stale clients alive forever
+@cached(LRUCache(maxsize=16), key=_s3_client_key, lock=Lock())
+def _s3_client(
+    profile: Optional[str],
+    endpoint_url: Optional[str],
+    creds: Any,
+    creds_key: Hashable = None,
+):
+    # pylint: disable=import-outside-toplevel,import-error,unused-argument,protected-access
+    from botocore.session import Session
+
+    sess = Session(profile=profile)
+    if callable(creds):
+        # client picks up session credentials, and refreshes them as they expire
+        sess._credentials = _refreshable_creds(creds)
+        return sess.create_client("s3", endpoint_url=endpoint_url)
+    if creds is None:
+        return sess.create_client("s3", endpoint_url=endpoint_url)
+    return sess.create_client(
+        "s3",
+        endpoint_url=endpoint_url,
+        aws_access_key_id=creds.access_key,
+        aws_secret_access_key=creds.secret_key,
+        aws_session_token=creds.token,
+    )
 
 
 class MultiPartUpload(S3Limits):
     """
     Dask to S3 dumper.
+
+    ``creds=`` can be a zero-argument callable returning credentials, it is
+    then called on each worker when the client is first needed, so secrets are
+    not serialised into every Dask task. It is called again whenever the
+    credentials are about to expire: return either ``ReadOnlyCredentials``
+    (re-fetched hourly) or a dictionary with ``access_key, secret_key, token,
+    expiry_time`` keys.
+
+    Clients are shared across uploads with the same ``profile, endpoint_url``
+    and credentials. For a factory, pass ``creds_key=`` to tell apart factories
+    that return different identities.
     """
 
     def __init__(
@@ -81,7 +202,12 @@ class MultiPartUpload(S3Limits):
         uploadId: str = "",
         profile: Optional[str] = None,
         endpoint_url: Optional[str] = None,
-        creds: Optional["ReadOnlyCredentials"] = None,
+        creds: Union[
+            "ReadOnlyCredentials",
+            Callable[[], Union["ReadOnlyCredentials", Mapping[str, Any]]],
+            None,
+        ] = None,
+        creds_key: Hashable = None,
     ):
         self.bucket = bucket
         self.key = key
@@ -89,23 +215,10 @@ class MultiPartUpload(S3Limits):
         self.profile = profile
         self.endpoint_url = endpoint_url
         self.creds = creds
+        self.creds_key = creds_key
 
-    @cached({})
     def s3_client(self):
-        # pylint: disable=import-outside-toplevel,import-error
-        from botocore.session import Session
-
-        sess = Session(profile=self.profile)
-        creds = self.creds
-        if creds is None:
-            return sess.create_client("s3", endpoint_url=self.endpoint_url)
-        return sess.create_client(
-            "s3",
-            endpoint_url=self.endpoint_url,
-            aws_access_key_id=creds.access_key,
-            aws_secret_access_key=creds.secret_key,
-            aws_session_token=creds.token,
-        )
+        return _s3_client(self.profile, self.endpoint_url, self.creds, self.creds_key)
 
     def initiate(self, **kw) -> str:
         assert self.uploadId == ""
@@ -121,7 +234,7 @@ class MultiPartUpload(S3Limits):
         assert self.uploadId != ""
         rr = s3.upload_part(
             PartNumber=part,
-            Body=data,
+            Body=_as_body(data),
             Bucket=self.bucket,
             Key=self.key,
             UploadId=self.uploadId,
@@ -129,6 +242,13 @@ class MultiPartUpload(S3Limits):
         etag = rr["ETag"]
         return {"PartNumber": part, "ETag": etag}
 
+    def put(self, data: SomeData, **kw) -> str:
+        """Upload whole object with a single request, bypassing multi-part."""
+        s3 = self.s3_client()
+        assert self.uploadId == ""
+        rr = s3.put_object(Bucket=self.bucket, Key=self.key, Body=_as_body(data), **kw)
+        return rr["ETag"]
+
     @property
     def url(self) -> str:
         return f"s3://{self.bucket}/{self.key}"
@@ -185,10 +305,12 @@ class MultiPartUpload(S3Limits):
             self.uploadId,
         )
 
-    def writer(self, kw, *, client: Any = None) -> PartsWriter:
+    def writer(
+        self, kw, *, client: Any = None, put_limit: Optional[int] = None
+    ) -> PartsWriter:
         if client is None:
             client = _dask_client()
-        writer = DelayedS3Writer(self, kw)
+        writer = DelayedS3Writer(self, kw, put_limit=put_limit)
         if client is not None:
             writer.prep_client(client)
         return writer
@@ -202,11 +324,16 @@ class MultiPartUpload(S3Limits):
         mk_footer: Any = None,
         user_kw: dict[str, Any] | None = None,
         writes_per_chunk: int = 1,
-        spill_sz: int = 20 * (1 << 20),
+        spill_sz: int | None = None,
         client: Any = None,
+        put_limit: Optional[int] = None,
         **kw,
     ) -> "Delayed":
-        write = self.writer(kw, client=client) if spill_sz else None
+        if spill_sz is None:
+            spill_sz = default_spill_sz(8 * (1 << 20))
+        write = (
+            self.writer(kw, client=client, put_limit=put_limit) if spill_sz else None
+        )
         return mpu_write(
             chunks,
             write,
@@ -233,9 +360,17 @@ class DelayedS3Writer(S3Limits):
 
     # pylint: disable=import-outside-toplevel,import-error
 
-    def __init__(self, mpu: MultiPartUpload, kw: dict[str, Any]):
+    def __init__(
+        self,
+        mpu: MultiPartUpload,
+        kw: dict[str, Any],
+        put_limit: Optional[int] = None,
+    ):
         self.mpu = mpu
         self.kw = kw  # mostly ContentType= kinda thing
+        # Output that was never spilled is written with a single PutObject
+        # as long as it fits, instead of as a one part multi-part upload
+        self.put_limit = self.max_write_sz if put_limit is None else put_limit
         self._shared_var: Optional["distributed.Variable"] = None
 
     def prep_client(self, client: "distributed.Client") -> "distributed.Variable":
@@ -315,5 +450,13 @@ class DelayedS3Writer(S3Limits):
             self.cleanup_client(client)
         return {"Bucket": mpu.bucket, "Key": mpu.key, "ETag": etag}
 
+    def put(self, data: SomeData) -> Any:
+        mpu = self.mpu
+        etag = mpu.put(data, **self.kw)
+        client = _dask_client()
+        if client:
+            self.cleanup_client(client)
+        return {"Bucket": mpu.bucket, "Key": mpu.key, "ETag": etag}
+
     def __dask_tokenize__(self):
         return ("odc.DelayedS3Writer", self.mpu.bucket, self.mpu.key)
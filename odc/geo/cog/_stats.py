@@ -0,0 +1,139 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2020 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Per band statistics written into COG metadata.
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from typing import TYPE_CHECKING, Dict
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import dask.array
+    from dask.delayed import Delayed
+
+
+_STATS_DTYPE = np.dtype(
+    [("n", "f8"), ("mean", "f8"), ("m2", "f8"), ("min", "f8"), ("max", "f8")]
+)
+
+
+def _stats_chunk(x: np.ndarray, axis, keepdims, nodata=None) -> np.ndarray:
+    """Per block ``(count, mean, sum of squared deviations, min, max)``."""
+    # pylint: disable=unused-argument
+    if x.dtype.kind not in "iuf":
+        x = x.astype("float64")
+
+    if x.dtype.kind == "f":
+        valid = np.isfinite(x)
+        if nodata is not None:
+            valid &= x != nodata
+        lo, hi = -np.inf, np.inf
+    else:
+        # integers are always finite, mask is a single comparison pass
+        valid = x != nodata if nodata is not None else np.ones(x.shape, dtype="bool")
+        lo, hi = np.iinfo(x.dtype).min, np.iinfo(x.dtype).max
+
+    n = valid.sum(axis=axis, keepdims=True)
+    acc = np.empty(n.shape, dtype=_STATS_DTYPE)
+    acc["n"] = n
+    acc["mean"] = np.divide(
+        x.sum(axis=axis, keepdims=True, dtype="float64", where=valid),
+        n,
+        out=np.zeros(n.shape),
+        where=n > 0,
+    )
+    dx = np.subtract(x, acc["mean"], dtype="float64")
+    acc["m2"] = np.square(dx, out=dx).sum(axis=axis, keepdims=True, where=valid)
+    acc["min"] = x.min(axis=axis, keepdims=True, where=valid, initial=hi)
+    acc["max"] = x.max(axis=axis, keepdims=True, where=valid, initial=lo)
+    return acc
+
+
+def _stats_combine(acc: np.ndarray, axis, keepdims) -> np.ndarray:
+    """Merge per block accumulators (pooled mean and variance)."""
+    n_i, mean_i = acc["n"], acc["mean"]
+    n = n_i.sum(axis=axis, keepdims=True)
+    out = np.empty(n.shape, dtype=_STATS_DTYPE)
+    out["n"] = n
+    out["mean"] = np.divide(
+        (n_i * mean_i).sum(axis=axis, keepdims=True),
+        n,
+        out=np.zeros(n.shape),
+        where=n > 0,
+    )
+    out["m2"] = (acc["m2"] + n_i * (mean_i - out["mean"]) ** 2).sum(
+        axis=axis, keepdims=True
+    )
+    out["min"] = acc["min"].min(axis=axis, keepdims=True, initial=np.inf)
+    out["max"] = acc["max"].max(axis=axis, keepdims=True, initial=-np.inf)
+    return out if keepdims else out.squeeze(axis=axis)
+
+
+def _stats_finalise(acc: np.ndarray, axis, npix: int) -> Dict[str, np.ndarray]:
+    acc = acc.squeeze(axis=axis)
+    n = acc["n"]
+    empty = n == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stddev = np.sqrt(acc["m2"] / n)
+    return {
+        "minimum": np.where(empty, np.nan, acc["min"]),
+        "maximum": np.where(empty, np.nan, acc["max"]),
+        "mean": np.where(empty, np.nan, acc["mean"]),
+        "stddev": stddev,
+        "valid_percent": n * (100 / npix),
+    }
+
+
+def _unwrap_stats(stats, ndim):
+    if ndim == 2:
+        return [{k: float(v) for k, v in stats.items()}]
+
+    n = {len(v) for v in stats.values()}.pop()
+    return [{k: v[idx] for k, v in stats.items()} for idx in range(n)]
+
+
+def _stats_from_layer(
+    pix: "dask.array.Array", nodata=None, yaxis: int = 0
+) -> "Delayed":
+    # pylint: disable=import-outside-toplevel
+    from dask import array as da
+    from dask import delayed
+
+    unwrap = delayed(_unwrap_stats, pure=True, traverse=True)
+
+    axis = (yaxis, yaxis + 1)
+    npix = pix.shape[yaxis] * pix.shape[yaxis + 1]
+
+    if nodata is None or np.isnan(nodata):
+        dd = pix
+        return unwrap(
+            {
+                "minimum": da.nanmin(dd, axis=axis),
+                "maximum": da.nanmax(dd, axis=axis),
+                "mean": da.nanmean(dd, axis=axis),
+                "stddev": da.nanstd(dd, axis=axis),
+                "valid_percent": da.isfinite(dd).sum(axis=axis) * (100 / npix),
+            },
+            pix.ndim,
+        )
+
+    # Exclude both nodata and invalid (e.g. NaN) values from statistics computation,
+    # all stats are accumulated in a single pass over the pixels
+    acc = da.reduction(
+        pix,
+        partial(_stats_chunk, nodata=nodata),
+        _stats_combine,
+        combine=_stats_combine,
+        axis=axis,
+        keepdims=True,
+        dtype=_STATS_DTYPE,
+        meta=np.empty((0,) * pix.ndim, dtype=_STATS_DTYPE),
+        name="cog-stats",
+    )
+    return unwrap(delayed(_stats_finalise, pure=True)(acc, axis, npix), pix.ndim)
@@ -0,0 +1,85 @@
+# This file is part of the Open Data Cube, see https://opendatacube.org for more information
+#
+# Copyright (c) 2015-2020 ODC Contributors
+# SPDX-License-Identifier: Apache-2.0
+"""
+Locate and patch tags of an already rendered COG header.
+"""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple, Union
+
+
+@dataclass(frozen=True)
+class _HdrLayout:
+    """
+    Location of the header values patched by :py:func:`_patch_hdr`.
+
+    Computed once from the empty COG header, so that the final header can be
+    assembled without re-parsing it.
+    """
+
+    byteorder: str
+    bigtiff: bool
+
+    # (IFD entry offset, value offset, value size in bytes) of GDAL metadata tag
+    md_tag: Optional[Tuple[int, int, int]]
+
+    # per page: (value offset, struct format) of tags 324 and 325
+    tile_tags: Tuple[Tuple[Tuple[int, str], Tuple[int, str]], ...]
+
+
+def _hdr_layout(hdr0: Union[bytes, memoryview]) -> _HdrLayout:
+    # pylint: disable=import-outside-toplevel,import-error
+    from tifffile import TIFF, TiffFile, TiffPage
+
+    def _fmt(tag) -> str:
+        return f"{tag.count}{TIFF.DATA_FORMATS[tag.dtype][-1]}"
+
+    with TiffFile(BytesIO(hdr0), name=":mem:") as tr:
+        md_tag = tr.pages.first.tags.get(42112, None)
+        if md_tag is not None:
+            md_tag = (md_tag.offset, md_tag.valueoffset, md_tag.count)
+
+        tile_tags = []
+        for page in tr.pages:
+            assert isinstance(page, TiffPage)
+            offsets, lengths = page.tags[324], page.tags[325]
+            tile_tags.append(
+                (
+                    (offsets.valueoffset, _fmt(offsets)),
+                    (lengths.valueoffset, _fmt(lengths)),
+                )
+            )
+        return _HdrLayout(tr.byteorder, tr.is_bigtiff, md_tag, tuple(tile_tags))
+
+
+def _overwrite_ascii_tag(
+    buf: bytearray, layout: _HdrLayout, tag: Tuple[int, int, int], value: str
+):
+    """Overwrite ASCII tag value, appending it to the end when it doesn't fit."""
+    packed = value.encode("ascii") + b"\x00"
+    entry, valueoffset, oldsize = tag
+    # IFD entry: tag, dtype, count, value|offset (count and value: 8 bytes in BigTIFF)
+    fmt, inline = ("QQ", 8) if layout.bigtiff else ("II", 4)
+
+    if len(packed) <= inline:
+        struct.pack_into(
+            f"{layout.byteorder}{fmt[0]}{inline}s", buf, entry + 4, len(packed), packed
+        )
+        return
+
+    if oldsize <= inline or len(packed) > oldsize:
+        if len(buf) % 2:
+            # value offset must begin on a word boundary
+            buf.append(0)
+        valueoffset = len(buf)
+        buf.extend(packed)
+    else:
+        buf[valueoffset : valueoffset + oldsize] = packed.ljust(oldsize, b"\x00")
+
+    struct.pack_into(layout.byteorder + fmt, buf, entry + 4, len(packed), valueoffset)
@@ -8,8 +8,10 @@ Write Cloud Optimized GeoTIFFs from xarrays.
 from __future__ import annotations
 
 import itertools
-from functools import partial
+import struct
+from functools import lru_cache, partial
 from io import BytesIO
+from operator import getitem
 from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 from xml.sax.saxutils import escape as xml_escape
 
@@ -31,9 +33,10 @@ from ._shared import (
     norm_blocksize,
     yaxis_from_shape,
 )
+from ._stats import _stats_from_layer
+from ._tiff_hdr import _hdr_layout, _HdrLayout, _overwrite_ascii_tag
 
 if TYPE_CHECKING:
-    import dask.array
     import dask.bag
     from dask.delayed import Delayed
 
@@ -47,73 +50,23 @@ def _render_gdal_metadata(
     eol: str = "",
     gdal_metadata_extra: Optional[List[str]] = None,
 ) -> str:
-    def _item(sample: int, stats: dict[str, float]) -> str:
-        return eol.join(
-            [
-                f'<Item name="STATISTICS_{k.upper()}" sample="{sample:d}">{v:{pad}.{precision}f}</Item>'
-                for k, v in stats.items()
-            ]
-        )
+    fmt = f'<Item name="STATISTICS_{{}}" sample="{{:d}}">{{:{pad}.{precision}f}}</Item>'
 
     if band_stats is None:
         band_stats = []
     if isinstance(band_stats, dict):
         band_stats = [band_stats]
 
-    gdal_metadata_extra = [] if gdal_metadata_extra is None else gdal_metadata_extra
-
-    body = eol.join(
-        [_item(sample, stats) for sample, stats in enumerate(band_stats)]
-        + gdal_metadata_extra
-    )
-    return eol.join(["<GDALMetadata>", body, "</GDALMetadata>"])
-
-
-def _unwrap_stats(stats, ndim):
-    if ndim == 2:
-        return [{k: float(v) for k, v in stats.items()}]
-
-    n = {len(v) for v in stats.values()}.pop()
-    return [{k: v[idx] for k, v in stats.items()} for idx in range(n)]
-
-
-def _stats_from_layer(
-    pix: "dask.array.Array", nodata=None, yaxis: int = 0
-) -> "Delayed":
-    # pylint: disable=import-outside-toplevel
-    from dask import array as da
-    from dask import delayed
-
-    unwrap = delayed(_unwrap_stats, pure=True, traverse=True)
-
-    axis = (yaxis, yaxis + 1)
-    npix = pix.shape[yaxis] * pix.shape[yaxis + 1]
-
-    if nodata is None or np.isnan(nodata):
-        dd = pix
-        return unwrap(
-            {
-                "minimum": da.nanmin(dd, axis=axis),
-                "maximum": da.nanmax(dd, axis=axis),
-                "mean": da.nanmean(dd, axis=axis),
-                "stddev": da.nanstd(dd, axis=axis),
-                "valid_percent": da.isfinite(dd).sum(axis=axis) * (100 / npix),
-            },
-            pix.ndim,
-        )
-
-    # Exclude both nodata and invalid (e.g. NaN) values from statistics computation
-    dd = da.ma.masked_where((pix == nodata) | ~(np.isfinite(pix)), pix)
-    return unwrap(
-        {
-            "minimum": dd.min(axis=axis),
-            "maximum": dd.max(axis=axis),
-            "mean": dd.mean(axis=axis),
-            "stddev": dd.std(axis=axis),
-            "valid_percent": da.isfinite(dd).sum(axis=axis) * (100 / npix),
-        },
-        pix.ndim,
+    parts = ["<GDALMetadata>"]
+    parts.extend(
+        fmt.format(k.upper(), sample, v)
+        for sample, stats in enumerate(band_stats)
+        for k, v in stats.items()
     )
+    if gdal_metadata_extra:
+        parts.extend(gdal_metadata_extra)
+    parts.append("</GDALMetadata>")
+    return eol.join(parts)
 
 
 def _make_empty_cog(
@@ -129,7 +82,7 @@ def _make_empty_cog(
     blocksize: Union[int, List[Union[int, Tuple[int, int]]]] = 2048,
     bigtiff: bool = True,
     **kw,
-) -> Tuple[CogMeta, memoryview]:
+) -> Tuple[CogMeta, bytes]:
     # pylint: disable=import-outside-toplevel,import-error
     have.check_or_error("tifffile", "rasterio", "xarray")
     from tifffile import (
@@ -202,12 +155,13 @@ def _make_empty_cog(
         )
     # TODO: support nodata/gdal_metadata without gbox?
 
-    _blocks = itertools.chain(iter(blocksize), itertools.repeat(blocksize[-1]))
+    # one block size per level, last one repeats for the remaining overviews
+    _blocks = [*blocksize, *[blocksize[-1]] * (nlevels + 1 - len(blocksize))]
 
     tw = TiffWriter(buf, bigtiff=bigtiff, shaped=False)
     metas: List[CogMeta] = []
 
-    for tsz, idx in zip(_blocks, range(nlevels + 1)):
+    for idx, tsz in enumerate(_blocks[: nlevels + 1]):
         tile = norm_blocksize(tsz)
         meta = CogMeta(
             ax,
@@ -244,7 +198,19 @@ def _make_empty_cog(
 
     tw.close()
 
-    return meta, buf.getbuffer()
+    # no buffer exported, so BytesIO hands over its storage without a copy
+    return meta, buf.getvalue()
+
+
+def _pad_tile(
+    block: np.ndarray, tile_shape: Tuple[int, ...], fill_value: Union[float, int]
+) -> np.ndarray:
+    """Pad edge tile to full tile shape with a single write pass."""
+    if block.shape == tile_shape:
+        return block
+    out = np.full(tile_shape, fill_value, dtype=block.dtype)
+    out[tuple(slice(0, n) for n in block.shape)] = block
+    return out
 
 
 def _cog_block_compressor_yxs(
@@ -255,11 +221,9 @@ def _cog_block_compressor_yxs(
     predictor: Any = None,
     fill_value: Union[float, int] = 0,
     **kw,
-) -> bytes:
+) -> Union[bytes, np.ndarray]:
     assert block.ndim == len(tile_shape)
-    if tile_shape != block.shape:
-        pad = tuple((0, want - have) for want, have in zip(tile_shape, block.shape))
-        block = np.pad(block, pad, "constant", constant_values=(fill_value,))
+    block = _pad_tile(block, tile_shape, fill_value)
 
     if predictor is not None:
         block = predictor(block, axis=1)
@@ -269,7 +233,8 @@ def _cog_block_compressor_yxs(
         except Exception:  # pylint: disable=broad-except
             return b""
 
-    return bytes(block.data)
+    # uncompressed: hand over pixel buffer as is, avoiding a copy into bytes
+    return np.ascontiguousarray(block)
 
 
 def _cog_block_compressor_syx(
@@ -281,7 +246,7 @@ def _cog_block_compressor_syx(
     fill_value: Union[float, int] = 0,
     sample_idx: int = 0,
     **kw,
-) -> bytes:
+) -> Union[bytes, np.ndarray]:
     assert isinstance(block, np.ndarray)
 
     if block.ndim == 2:
@@ -292,9 +257,7 @@ def _cog_block_compressor_syx(
         block = block[sample_idx, :, :]
 
     assert block.ndim == 2
-    if tile_shape != block.shape:
-        pad = tuple((0, want - have) for want, have in zip(tile_shape, block.shape))
-        block = np.pad(block, pad, "constant", constant_values=(fill_value,))
+    block = _pad_tile(block, tile_shape, fill_value)
 
     if predictor is not None:
         block = predictor(block, axis=1)
@@ -305,50 +268,99 @@ def _cog_block_compressor_syx(
         except Exception:  # pylint: disable=broad-except
             return b""
 
-    return bytes(block.data)
+    # uncompressed: hand over pixel buffer as is, avoiding a copy into bytes
+    return np.ascontiguousarray(block)
+
+
+_NAN = float("nan")
 
 
 def _mk_tile_compressor(
     meta: CogMeta, sample_idx: int = 0
-) -> Callable[[np.ndarray], bytes]:
+) -> Callable[[np.ndarray], Union[bytes, np.ndarray]]:
     # pylint: disable=import-outside-toplevel,import-error
     have.check_or_error("tifffile")
-    from tifffile import TIFF
-
-    tile_shape = meta.chunks
-    encoder = TIFF.COMPRESSORS[meta.compression]
-
-    predictor = None
-    if meta.predictor != 1:
-        predictor = TIFF.PREDICTORS[meta.predictor]
 
     fill_value: Union[float, int] = 0
     if meta.nodata is not None:
         fill_value = float(meta.nodata) if isinstance(meta.nodata, str) else meta.nodata
+        if isinstance(fill_value, float) and np.isnan(fill_value):
+            # NaN != NaN, cache key only matches when it is the same object
+            fill_value = _NAN
+
+    tile_shape = meta.tile.yx if meta.axis == "SYX" else meta.chunks
+    compressionargs = tuple(sorted(meta.compressionargs.items()))
+    kw: Dict[str, Any] = {
+        "compression": meta.compression,
+        "predictor": meta.predictor,
+        "fill_value": fill_value,
+        "sample_idx": sample_idx,
+        "compressionargs": compressionargs,
+    }
+    try:
+        hash(compressionargs)
+    except TypeError:
+        # nested compression args (e.g. LERC), can't be cached
+        return _tile_compressor.__wrapped__(meta.axis, tile_shape, **kw)
+    return _tile_compressor(meta.axis, tile_shape, **kw)
+
+
+@lru_cache(maxsize=128)
+def _tile_compressor(
+    axis: str,
+    tile_shape: Tuple[int, ...],
+    *,
+    compression: int,
+    predictor: int,
+    fill_value: Union[float, int],
+    sample_idx: int,
+    compressionargs: Tuple[Tuple[str, Any], ...],
+) -> Callable[[np.ndarray], Union[bytes, np.ndarray]]:
+    # pylint: disable=import-outside-toplevel,import-error
+    from tifffile import TIFF
 
-    if meta.axis == "SYX":
+    encoder = None if compression == 1 else TIFF.COMPRESSORS[compression]
+    _predictor = None if predictor == 1 else TIFF.PREDICTORS[predictor]
+
+    if axis == "SYX":
+        ny, nx = tile_shape
         return partial(
             _cog_block_compressor_syx,
-            tile_shape=meta.tile.yx,
+            tile_shape=(ny, nx),
             encoder=encoder,
-            predictor=predictor,
+            predictor=_predictor,
             fill_value=fill_value,
             sample_idx=sample_idx,
-            **meta.compressionargs,
+            **dict(compressionargs),
         )
 
     return partial(
         _cog_block_compressor_yxs,
         tile_shape=tile_shape,
         encoder=encoder,
-        predictor=predictor,
+        predictor=_predictor,
         fill_value=fill_value,
-        **meta.compressionargs,
+        **dict(compressionargs),
     )
 
 
-def _compress_cog_tile(encoder, block, idx):
-    return [(encoder(block), idx)]
+def _compress_cog_tiles(encoder, blocks, idxs):
+    return [(encoder(block), idx) for block, idx in zip(blocks, idxs)]
+
+
+def _tiles_per_task(ntiles: int, max_batch: int = 32, min_tasks: int = 16) -> int:
+    """Number of tiles to compress per Dask task."""
+    return max(1, min(max_batch, ntiles // min_tasks))
+
+
+def _tile_aligned(chunks: Tuple[int, ...], tsz: int) -> bool:
+    """Check that every chunk boundary falls on a tile boundary."""
+    return all(ch % tsz == 0 for ch in chunks[:-1])
+
+
+def _tile_to_block(chunks: Tuple[int, ...], tsz: int) -> List[Tuple[int, int]]:
+    """Map tile index to ``(block index, pixel offset within block)``."""
+    return [(i, off) for i, ch in enumerate(chunks) for off in range(0, ch, tsz)]
 
 
 def _compress_tiles(
@@ -372,30 +384,40 @@ def _compress_tiles(
 
     data = xx.data
     assert is_dask_collection(data)
+    tile = meta.tile.yx
 
     if meta.axis == "SYX":
         src_ydim = 1
         if data.ndim == 2:
-            _chunks: Tuple[int, ...] = meta.tile.yx
+            _chunks: Tuple[int, ...] = tile
         elif len(data.chunks[0]) == 1:
             # if 1 single chunk with all "samples", keep it that way
-            _chunks = (data.shape[0], *meta.tile.yx)
+            _chunks = (data.shape[0], *tile)
         else:
             # else have 1 chunk per "sample"
-            _chunks = (1, *meta.tile.yx)
-
-        if data.chunksize != _chunks:
-            data = data.rechunk(_chunks)
+            _chunks = (1, *tile)
+        samples_ok = data.ndim == 2 or _chunks[0] == max(data.chunks[0])
     else:
         assert meta.num_planes == 1
         src_ydim = 0
-        if data.chunksize != meta.chunks:
-            data = data.rechunk(meta.chunks)
+        _chunks = meta.chunks
+        samples_ok = data.ndim == 2 or len(data.chunks[2]) == 1
+
+    # Chunks that are whole multiples of the tile size can be cut into tiles
+    # within the compression task, only re-chunk when tiles straddle chunks
+    yx_chunks = data.chunks[src_ydim : src_ydim + 2]
+    if not (samples_ok and all(map(_tile_aligned, yx_chunks, tile))):
+        data = data.rechunk(_chunks)
+        yx_chunks = data.chunks[src_ydim : src_ydim + 2]
+
+    ty, tx = map(_tile_to_block, yx_chunks, tile)
 
     encoder = _mk_tile_compressor(meta, sample_idx)
 
+    # dask array name already encodes upstream graph, no need to hash the array
     tk = tokenize(
-        data,
+        data.name,
+        data.chunks,
         scale_idx,
         meta.axis,
         meta.chunks,
@@ -419,10 +441,27 @@ def _compress_tiles(
             return (src_data_name, 0, y, x)
         return (src_data_name, s, y, x)
 
+    def tile_block(s, y, x):
+        (yi, y0), (xi, x0) = ty[y], tx[x]
+        block = block_name(s, yi, xi)
+        if yx_chunks[0][yi] <= tile[0] and yx_chunks[1][xi] <= tile[1]:
+            return block
+        roi = (slice(y0, y0 + tile[0]), slice(x0, x0 + tile[1]))
+        return (getitem, block, (slice(None),) * src_ydim + roi)
+
+    # Group several tiles per task, per task overhead dominates for small tiles
+    tidx = list(meta.tidx(sample_idx))
+    batch = _tiles_per_task(len(tidx))
+
     dsk: Any = {}
-    for i, (s, y, x) in enumerate(meta.tidx(sample_idx)):
-        block = block_name(s, y, x)
-        dsk[name, i] = (_compress_cog_tile, encoder, block, quote((scale_idx, s, y, x)))
+    for i, i0 in enumerate(range(0, len(tidx), batch)):
+        _tidx = tidx[i0 : i0 + batch]
+        dsk[name, i] = (
+            _compress_cog_tiles,
+            encoder,
+            [tile_block(s, y, x) for s, y, x in _tidx],
+            quote([(scale_idx, s, y, x) for s, y, x in _tidx]),
+        )
 
     nparts = len(dsk)
     dsk = HighLevelGraph.from_collections(name, dsk, dependencies=[data])
@@ -451,18 +490,28 @@ def _extract_tile_info(
     start_offset: int = 0,
 ) -> List[Tuple[List[int], List[int]]]:
     mm = meta.flatten()
-    tile_info = [([0] * m.num_tiles, [0] * m.num_tiles) for m in mm]
-
-    byte_offset = start_offset
-    for scale_idx, p, y, x, sz in tiles:
-        m = mm[scale_idx]
-        b_offsets, b_lengths = tile_info[scale_idx]
-
-        tidx = m.flat_tile_idx((p, y, x))
-        if sz != 0:
-            b_lengths[tidx] = sz
-            b_offsets[tidx] = byte_offset
-            byte_offset += sz
+    tt = np.asarray(tiles, dtype="int64").reshape(-1, 5)
+    scale, p, y, x, sz = tt.T
+    offsets = np.cumsum(sz) - sz + start_offset
+    if ((scale < 0) | (scale >= len(mm))).any():
+        raise IndexError()
+
+    tile_info = []
+    for scale_idx, m in enumerate(mm):
+        ns, (ny, nx) = m.num_planes, m.chunked.yx
+        b_offsets = np.zeros(m.num_tiles, dtype="int64")
+        b_lengths = np.zeros(m.num_tiles, dtype="int64")
+
+        sel = scale == scale_idx
+        for i, n in ((p, ns), (y, ny), (x, nx)):
+            if ((i[sel] < 0) | (i[sel] >= n)).any():
+                raise IndexError()
+
+        sel &= sz != 0
+        tidx = p[sel] * (ny * nx) + y[sel] * nx + x[sel]
+        b_offsets[tidx] = offsets[sel]
+        b_lengths[tidx] = sz[sel]
+        tile_info.append((b_offsets.tolist(), b_lengths.tolist()))
 
     return tile_info
 
@@ -470,39 +519,47 @@ def _extract_tile_info(
 def _patch_hdr(
     tiles: List[Tuple[int, Tuple[int, int, int, int]]],
     meta: CogMeta,
-    hdr0: bytes,
+    hdr0: Union[bytes, memoryview],
     stats: Optional[list[dict[str, float]]] = None,
     gdal_metadata_extra: Optional[List[str]] = None,
+    *,
+    layout: Optional[_HdrLayout] = None,
 ) -> bytes:
-    # pylint: disable=import-outside-toplevel,import-error
-    from tifffile import TiffFile, TiffPage
+    if layout is None:
+        layout = _hdr_layout(hdr0)
 
     _tiles = [(*idx, sz) for sz, idx in tiles]
     tile_info = _extract_tile_info(meta, _tiles, 0)
+    assert len(tile_info) == len(layout.tile_tags)
+
+    buf = bytearray(hdr0)
+    if stats is not None or gdal_metadata_extra:
+        assert layout.md_tag is not None
+        gdal_metadata = _render_gdal_metadata(
+            stats, precision=6, gdal_metadata_extra=gdal_metadata_extra
+        )
+        _overwrite_ascii_tag(buf, layout, layout.md_tag, gdal_metadata)
+
+    hdr_sz = len(buf)
 
-    _bio = BytesIO(hdr0)
-    with TiffFile(_bio, mode="r+", name=":mem:") as tr:
-        assert len(tile_info) == len(tr.pages)
-        if stats is not None or gdal_metadata_extra:
-            md_tag = tr.pages.first.tags.get(42112, None)
-            assert md_tag is not None
-            gdal_metadata = _render_gdal_metadata(
-                stats, precision=6, gdal_metadata_extra=gdal_metadata_extra
-            )
-            md_tag.overwrite(gdal_metadata)
+    # 324 -- offsets
+    # 325 -- byte counts
+    bo = layout.byteorder
+    for ((off_pos, off_fmt), (sz_pos, sz_fmt)), (offsets, lengths) in zip(
+        layout.tile_tags, tile_info
+    ):
+        struct.pack_into(bo + off_fmt, buf, off_pos, *(off + hdr_sz for off in offsets))
+        struct.pack_into(bo + sz_fmt, buf, sz_pos, *lengths)
 
-        hdr_sz = len(_bio.getbuffer())
+    return bytes(buf)
 
-        # 324 -- offsets
-        # 325 -- byte counts
-        for info, page in zip(tile_info, tr.pages):
-            assert isinstance(page, TiffPage)
-            tags = page.tags
-            offsets, lengths = info
-            tags[324].overwrite([off + hdr_sz for off in offsets])
-            tags[325].overwrite(lengths)
 
-    return bytes(_bio.getbuffer())
+# (dtype.kind, dtype.itemsize) -> predictor used for ``predictor=True``
+# floating point: 3, integers up to 32 bits: 2, everything else: 1 (none)
+_AUTO_PREDICTOR = {
+    **{("f", sz): 3 for sz in (2, 4, 8, 12, 16)},
+    **{(kind, sz): 2 for kind in "ui" for sz in (1, 2, 4)},
+}
 
 
 def _norm_predictor(predictor: Union[int, bool, None], dtype: Any) -> int:
@@ -511,11 +568,7 @@ def _norm_predictor(predictor: Union[int, bool, None], dtype: Any) -> int:
 
     if predictor is True:
         dtype = np.dtype(dtype)
-        if dtype.kind == "f":
-            return 3
-        if dtype.kind in "ui" and dtype.itemsize <= 4:
-            return 2
-        return 1
+        return _AUTO_PREDICTOR.get((dtype.kind, dtype.itemsize), 1)
     return predictor
 
 
@@ -579,6 +632,17 @@ def _norm_compression_tifffile(
     return (predictor, compression, compressionargs)
 
 
+# xml_escape(xml_escape(text)) as a single translation table
+_GDAL_DOUBLE_ESCAPE = str.maketrans({c: xml_escape(xml_escape(c)) for c in "&<>"})
+
+
+@lru_cache(maxsize=1024)
+def _gdal_double_escape(text: str) -> str:
+    # GDAL does double escaping; see frmts/gtiff/geotiff.cpp.
+    # We also double escape to maximize compatibility with tools expecting GDAL-generated metadata.
+    return text.translate(_GDAL_DOUBLE_ESCAPE)
+
+
 def _gdal_sample_description(sample: int, description: str) -> str:
     """Make XML line of GDAL metadata.
 
@@ -587,9 +651,7 @@ def _gdal_sample_description(sample: int, description: str) -> str:
 
     :return: GDAL XML metadata line to place in TIFF file.
     """
-    # GDAL does double escaping; see frmts/gtiff/geotiff.cpp.
-    # We also double escape to maximize compatibility with tools expecting GDAL-generated metadata.
-    double_escaped_description = xml_escape(xml_escape(description))
+    double_escaped_description = _gdal_double_escape(description)
     return f'<Item name="DESCRIPTION" sample="{sample}" role="description">{double_escaped_description}</Item>'
 
 
@@ -693,7 +755,6 @@ def save_cog_with_dask(
         gdal_metadata=gdal_metadata,
         **kw,
     )
-    hdr0 = bytes(hdr0)
 
     if band_names and len(band_names) != meta.nsamples:
         raise ValueError(
@@ -715,8 +776,6 @@ def save_cog_with_dask(
     for scale_idx, (mm, img) in enumerate(zip(meta.flatten(), layers)):
         for sample_idx in range(meta.num_planes):
             tt = _compress_tiles(img, mm, scale_idx=scale_idx, sample_idx=sample_idx)
-            if tt.npartitions > 20:
-                tt = tt.repartition(npartitions=tt.npartitions // 4)
             _tiles.append(tt)
 
     if dst == "":
@@ -728,6 +787,9 @@ def save_cog_with_dask(
             "_stats": _stats,
         }
 
+    # header tag locations are fixed, find them once rather than when finalising
+    hdr_layout = _hdr_layout(hdr0)
+
     tiles_write_order = _tiles[::-1]
     if len(tiles_write_order) > 4:
         tiles_write_order = [
@@ -746,6 +808,7 @@ def save_cog_with_dask(
             user_kw={
                 "meta": meta,
                 "hdr0": hdr0,
+                "layout": hdr_layout,
                 "stats": _stats,
                 "gdal_metadata_extra": sample_descriptions_metadata,
             },
@@ -757,6 +820,7 @@ def save_cog_with_dask(
     )
 
     cleanup = aws.pop("cleanup", False)
+    put_limit = aws.pop("put_limit", None)
     s3_sink = MultiPartUpload(bucket, key, **aws)
     if cleanup:
         s3_sink.cancel("all")
@@ -766,10 +830,12 @@ def save_cog_with_dask(
         user_kw={
             "meta": meta,
             "hdr0": hdr0,
+            "layout": hdr_layout,
             "stats": _stats,
             "gdal_metadata_extra": sample_descriptions_metadata,
         },
         client=client,
+        put_limit=put_limit,
         **upload_params,
     )
 
@@ -8,7 +8,7 @@ from typing import Any, List, Tuple, Union
 from .crs import CRS, MaybeCRS, Optional, norm_crs
 from .gcp import GCPGeoBox
 from .geobox import GeoBox
-from .geom import Geometry, point
+from .geom import Geometry, geoms_to_crs, point
 from .types import XY, xy_
 
 
@@ -53,11 +53,11 @@ def extract_gcps(
     pix, wld, gcp_crs = extract_gcps_raw(src)
     output_crs = norm_crs(output_crs)
 
-    wld_pts = (point(pt.x, pt.y, gcp_crs) for pt in wld)
+    wld_pts = [point(pt.x, pt.y, gcp_crs) for pt in wld]
     if output_crs is not None and gcp_crs != output_crs:
-        wld_pts = (pt.to_crs(output_crs) for pt in wld_pts)
+        wld_pts = geoms_to_crs(wld_pts, output_crs)
 
-    return pix, list(wld_pts)
+    return pix, wld_pts
 
 
 def map_crs(m: Any, /) -> Optional[CRS]:
@@ -3,6 +3,7 @@
 # Copyright (c) 2015-2020 ODC Contributors
 # SPDX-License-Identifier: Apache-2.0
 import warnings
+from threading import Lock
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -77,10 +78,11 @@ def _make_crs(
 
 
 def _make_crs_transform_key(from_crs, to_crs, always_xy):
+    # pyproj CRS objects are pinned by _crs_cache, so their ids are stable
     return (id(from_crs), id(to_crs), always_xy)
 
 
-@cachetools.cached({}, key=_make_crs_transform_key)
+@cachetools.cached({}, key=_make_crs_transform_key, lock=Lock())
 def _make_crs_transform(from_crs: _CRS, to_crs: _CRS, always_xy: bool) -> Transformer:
     return Transformer.from_crs(from_crs, to_crs, always_xy=always_xy)
 
@@ -300,7 +302,7 @@ class CRS:
 
     def transformer_to_crs(
         self, other: "CRS", always_xy: bool = True
-    ) -> Callable[[Any, Any], Tuple[Any, Any]]:
+    ) -> Callable[..., Tuple[Any, Any]]:
         """
         Build coordinate transformer to other projection.
 
@@ -308,6 +310,11 @@ class CRS:
         stored either as scalars or :py:class:`numpy.ndarray` objects, and ``x', y'`` are the same
         points in the ``other`` CRS.
 
+        The returned function also accepts ``out=(x_out, y_out)``, a pair of pre-allocated
+        ``float64`` arrays of the same shape as the inputs, results are then written into those
+        buffers instead of freshly allocated arrays. Passing ``inplace=True`` overwrites ``x, y``
+        directly when they are ``float64`` arrays.
+
         :param other:
               Destination CRS
 
@@ -320,13 +327,26 @@ class CRS:
         # pylint: disable=protected-access
         tr = _make_crs_transform(self._crs, other._crs, always_xy=always_xy)
 
-        def result(x, y, **kw):
+        def result(x, y, out=None, **kw):
+            if out is not None:
+                rx, ry = out
+                numpy.copyto(rx, x)
+                numpy.copyto(ry, y)
+                x, y = rx, ry
+                kw["inplace"] = True
+
             rx, ry = tr.transform(x, y, **kw)  # pylint: disable=unpacking-non-sequence
 
+            if out is not None and rx is not out[0]:
+                # pyproj returns new values instead for inputs it can't transform in place
+                out[0][...], out[1][...] = rx, ry
+                rx, ry = out
+
             if not isinstance(rx, numpy.ndarray) or not isinstance(ry, numpy.ndarray):
                 return (rx, ry)
 
-            missing = numpy.isnan(rx) | numpy.isnan(ry)
+            missing = numpy.isnan(rx)
+            missing |= numpy.isnan(ry)
             rx[missing] = numpy.nan
             ry[missing] = numpy.nan
             return (rx, ry)
@@ -5,6 +5,7 @@
 from typing import List, Optional, Tuple, Union
 
 import numpy as np
+import shapely
 from affine import Affine
 
 from .crs import CRS, MaybeCRS, SomeCRS, norm_crs
@@ -20,7 +21,7 @@ def _points_to_array(pts: SomePointSet) -> Tuple[np.ndarray, Optional[CRS]]:
     if isinstance(pts, np.ndarray):
         return pts, None
     if isinstance(pts, Geometry):
-        return np.asarray([pt.coords[0] for pt in pts.geoms]), pts.crs
+        return shapely.get_coordinates(pts.geom), pts.crs
 
     def _xy(pt: Union[Geometry, XY[float]]) -> Tuple[float, float]:
         if isinstance(pt, Geometry):
@@ -23,18 +23,24 @@ from typing import (
 )
 
 import numpy
+import shapely
 from affine import Affine
 from pyproj.aoi import AreaOfInterest
+from pyproj.transformer import Transformer
 from shapely import geometry, ops
 from shapely.geometry import base
 
 from ._interop import have
 from .crs import CRS, CRSMismatchError, MaybeCRS, SomeCRS, norm_crs, norm_crs_or_error
-from .math import edge_index, quasi_random_r2
+from .math import apply_affine, edge_index, quasi_random_r2
 from .types import SomeShape, SupportsCoords, Unset, shape_
 
 CoordList = List[Tuple[float, float]]
 
+# shapely.disjoint_subset_union_all: added in shapely 2.1, needs GEOS>=3.12
+_SHAPELY_VERSION = tuple(int(v) for v in shapely.__version__.split(".")[:2])
+_HAVE_DISJOINT_UNION = _SHAPELY_VERSION >= (2, 1) and shapely.geos_version >= (3, 12)
+
 # pylint: disable=too-many-lines,too-many-public-methods
 
 
@@ -393,6 +399,12 @@ def wrap_shapely(method):
 
 
 def force_2d(geojson: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop coordinates past ``x, y`` from a GeoJSON-like geometry dictionary.
+
+    Rectangular numeric coordinates are returned as nested lists: tuples become lists and mixed
+    int/float values all become float. Ragged coordinates keep the sequence types of the input.
+    """
     assert "type" in geojson
     assert "coordinates" in geojson
 
@@ -410,7 +422,19 @@ def force_2d(geojson: Dict[str, Any]) -> Dict[str, Any]:
 
         raise ValueError(f"invalid coordinate {x}")
 
-    return {"type": geojson["type"], "coordinates": go(geojson["coordinates"])}
+    coords = geojson["coordinates"]
+    try:
+        # fast path for rectangular numeric input (all but GeometryCollection-like)
+        xx = numpy.asarray(coords)
+    except ValueError:
+        xx = None
+
+    if xx is not None and xx.dtype.kind in "iuf":
+        coords = xx[..., :2].tolist()
+    else:
+        coords = go(coords)
+
+    return {"type": geojson["type"], "coordinates": coords}
 
 
 def _geojson_to_shapely(xx: Any) -> base.BaseGeometry:
@@ -439,26 +463,40 @@ def _geojson_to_shapely(xx: Any) -> base.BaseGeometry:
 def densify(coords: CoordList, resolution: float) -> CoordList:
     """
     Adds points so they are at most `resolution` units apart.
+
+    Always returns a list of float ``(x, y)`` tuples, points are not added when ``resolution``
+    is not positive.
     """
-    d2 = resolution**2
+    if len(coords) == 0:
+        return []
+
+    xy = numpy.asarray(coords, dtype="float64")
+    if len(xy) < 2:
+        return list(map(tuple, xy.tolist()))
 
-    def short_enough(p1, p2):
-        return (p1[0] ** 2 + p2[0] ** 2) < d2
+    seg = numpy.diff(xy, axis=0)
+    seg_len = numpy.hypot(seg[:, 0], seg[:, 1])
 
-    new_coords = [coords[0]]
-    for p1, p2 in zip(coords[:-1], coords[1:]):
-        if not short_enough(p1, p2):
-            segment = geometry.LineString([p1, p2])
-            segment_length = segment.length
-            d = resolution
-            while d < segment_length:
-                (pt,) = segment.interpolate(d).coords
-                new_coords.append(pt)
-                d += resolution
+    # number of points to insert per segment: at resolution, 2*resolution, ... < length
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        n_new = numpy.ceil(seg_len / resolution) - 1
+    n_new = numpy.where(numpy.isfinite(n_new) & (n_new > 0), n_new, 0).astype("int64")
+    total = int(n_new.sum())
+    if total == 0:
+        return list(map(tuple, xy.tolist()))
 
-        new_coords.append(p2)
+    iseg = numpy.repeat(numpy.arange(len(seg)), n_new)
+    k = numpy.arange(1, total + 1) - numpy.repeat(numpy.cumsum(n_new) - n_new, n_new)
+    t = (k * resolution / seg_len[iseg])[:, None]
 
-    return new_coords
+    out = numpy.empty((len(xy) + total, 2), dtype="float64")
+    is_vertex = numpy.zeros(len(out), dtype="bool")
+    ivertex = numpy.arange(len(xy)) + numpy.concatenate([[0], numpy.cumsum(n_new)])
+    is_vertex[ivertex] = True
+    out[is_vertex] = xy
+    out[~is_vertex] = xy[iseg] + t * seg[iseg]
+
+    return list(map(tuple, out.tolist()))
 
 
 def _clone_shapely_geom(geom: base.BaseGeometry) -> base.BaseGeometry:
@@ -507,6 +545,19 @@ class Geometry(SupportsCoords[float]):
     def clone(self) -> "Geometry":
         return Geometry(self)
 
+    def prepare(self) -> "Geometry":
+        """
+        Prepare geometry for repeated predicate evaluation (in place).
+
+        Builds a spatial index on the underlying shapely geometry, so that subsequent calls to
+        ``contains``, ``intersects``, ``covers`` and friends with this geometry as the first
+        argument run faster. Useful when testing one reference geometry against many others.
+
+        :returns: ``self``
+        """
+        shapely.prepare(self.geom)
+        return self
+
     # fmt: off
     @wrap_shapely
     def contains(self, other: "Geometry") -> bool: return self.contains(other)
@@ -543,13 +594,14 @@ class Geometry(SupportsCoords[float]):
 
     def _repr_svg_(self) -> str: return self.geom._repr_svg_()
 
+    # Geometry is treated as immutable, so values that need GEOS work are cached
     @property
     def geom_type(self) -> str: return self.geom.geom_type
     @property
     def type(self) -> str: return self.geom.type
     @property
     def is_empty(self) -> bool: return self.geom.is_empty
-    @property
+    @functools.cached_property
     def is_valid(self) -> bool: return self.geom.is_valid
     @property
     def is_ring(self) -> bool: return self.geom.is_ring
@@ -559,23 +611,23 @@ class Geometry(SupportsCoords[float]):
     def exterior(self) -> "Geometry": return Geometry(self.geom.exterior, self.crs)
     @property
     def interiors(self) -> List["Geometry"]: return [Geometry(g, self.crs) for g in self.geom.interiors]
-    @property
+    @functools.cached_property
     def centroid(self) -> "Geometry": return Geometry(self.geom.centroid, self.crs)
     @property
     def coords(self) -> CoordList: return list(self.geom.coords)
     @property
     def points(self) -> CoordList: return self.coords
-    @property
+    @functools.cached_property
     def length(self) -> float: return self.geom.length
-    @property
+    @functools.cached_property
     def area(self) -> float: return self.geom.area
     @property
     def xy(self) -> Tuple[array.array, array.array]: return self.geom.xy
-    @property
+    @functools.cached_property
     def convex_hull(self) -> "Geometry": return Geometry(self.geom.convex_hull, self.crs)
-    @property
+    @functools.cached_property
     def envelope(self) -> "Geometry": return Geometry(self.geom.envelope, self.crs)
-    @property
+    @functools.cached_property
     def boundingbox(self) -> BoundingBox:
         minx, miny, maxx, maxy = self.geom.bounds
         return BoundingBox(left=minx, right=maxx, bottom=miny, top=maxy, crs=self.crs)
@@ -649,16 +701,24 @@ class Geometry(SupportsCoords[float]):
         may be iterable types like lists or arrays or single values. The output shall be of the same
         type: scalars in, scalars out; lists in, lists out.
 
+        ``func`` can also be an :py:class:`affine.Affine` or a :py:class:`pyproj.Transformer`, these
+        are applied to all coordinates at once, ``z`` coordinates of 3D geometries are kept as is.
+
         :param crs: If supplied override output CRS with that value, ``crs=None`` will remove CRS
         for the output, default is to keep the original projection.
         """
         if isinstance(func, Affine):
-
-            def _tr(A, x, y):
-                _xy = [A * xy for xy in zip(x, y)]
-                return [x for x, _ in _xy], [y for _, y in _xy]
-
-            _geom = ops.transform(functools.partial(_tr, func), self.geom)
+            _geom = shapely.transform(
+                self.geom,
+                functools.partial(_affine_xy, func),
+                include_z=_has_z(self.geom),
+            )
+        elif isinstance(func, Transformer):
+            _geom = shapely.transform(
+                self.geom,
+                functools.partial(_transform_xy, func.transform),
+                include_z=_has_z(self.geom),
+            )
         else:
             _geom = ops.transform(func, self.geom)
 
@@ -669,7 +729,10 @@ class Geometry(SupportsCoords[float]):
 
     def _to_crs(self, crs: CRS) -> "Geometry":
         assert self.crs is not None
-        return Geometry(ops.transform(self.crs.transformer_to_crs(crs), self.geom), crs)
+        tr = _xy_transformer(self.crs, crs)
+        return Geometry(
+            shapely.transform(self.geom, tr, include_z=_has_z(self.geom)), crs
+        )
 
     def to_crs(
         self,
@@ -682,6 +745,8 @@ class Geometry(SupportsCoords[float]):
         """
         Convert geometry to a different Coordinate Reference System.
 
+        Only ``x, y`` are projected, ``z`` coordinates of 3D geometries are kept as is.
+
         :param crs:
           CRS to convert to
 
@@ -810,7 +875,21 @@ class Geometry(SupportsCoords[float]):
         if splitter.crs != self.crs:
             raise CRSMismatchError(self.crs, splitter.crs)
 
-        for g in ops.split(self.geom, splitter.geom).geoms:
+        geom = self.geom
+        if geom.geom_type == "MultiPolygon" and len(geom.geoms) > 16:
+            # only split parts that the splitter actually touches, keeping part order
+            parts = list(geom.geoms)
+            tree = shapely.STRtree(parts)
+            hit = set(tree.query(splitter.geom, predicate="intersects").tolist())
+            for i, part in enumerate(parts):
+                if i in hit:
+                    for g in ops.split(part, splitter.geom).geoms:
+                        yield Geometry(g, self.crs)
+                else:
+                    yield Geometry(part, self.crs)
+            return
+
+        for g in ops.split(geom, splitter.geom).geoms:
             yield Geometry(g, self.crs)
 
     def explore(
@@ -999,8 +1078,9 @@ class Geometry(SupportsCoords[float]):
             return Geometry(geometry.Point(), self.crs)
 
         if self.geom_type == "MultiPoint":
-            pts = [(x, y) for x, y in [pt.points[0] for pt in self.geoms] if pred(x, y)]
-            return multipoint(pts, self.crs)
+            xy = shapely.get_coordinates(self.geom)
+            keep = numpy.asarray([pred(x, y) for x, y in xy.tolist()], dtype=bool)
+            return Geometry(shapely.multipoints(xy[keep]), self.crs)
 
         if self.is_multi:
             _filtered = [g.filter(pred).geom for g in self.geoms]
@@ -1017,6 +1097,65 @@ class Geometry(SupportsCoords[float]):
         return self.filter(lambda x, y: math.isfinite(x) and math.isfinite(y))
 
 
+def _transform_xy(tr: Callable[..., Any], coords: numpy.ndarray) -> numpy.ndarray:
+    """
+    Apply pyproj style ``tr(x, y, inplace=True)`` to ``(N, 2|3)`` coordinates.
+
+    Only ``x, y`` are transformed, ``z`` (if present) is passed through as is.
+    """
+    # contiguous rows, so that pyproj can transform them in place
+    out = numpy.array(coords.T, dtype="float64", order="C")
+    if out.shape[1] == 1:
+        # pyproj treats size 1 arrays as scalars, pass scalars in directly
+        out[:2, 0] = tr(out[0, 0].item(), out[1, 0].item())
+    else:
+        tr(out[0], out[1], inplace=True)
+    return out.T
+
+
+def _affine_xy(A: Affine, coords: numpy.ndarray) -> numpy.ndarray:
+    out = numpy.array(coords, dtype="float64")
+    out[:, 0], out[:, 1] = apply_affine(A, coords[:, 0], coords[:, 1])
+    return out
+
+
+def _xy_transformer(src: CRS, dst: CRS) -> Callable[[numpy.ndarray], numpy.ndarray]:
+    # adapt CRS transformer to the (N, 2|3) -> (N, 2|3) form used by shapely.transform
+    return functools.partial(_transform_xy, src.transformer_to_crs(dst))
+
+
+def _has_z(geom) -> bool:
+    return bool(numpy.any(shapely.has_z(geom)))
+
+
+def geoms_to_crs(geoms: Iterable[Geometry], crs: SomeCRS) -> List[Geometry]:
+    """
+    Project many geometries to a different CRS in one go.
+
+    Same as ``[g.to_crs(crs) for g in geoms]`` without ``resolution`` and ``wrapdateline``
+    options, but vertices of all geometries are projected with a single transformer call.
+
+    :param geoms: Geometries, all in the same CRS
+    :param crs: CRS to convert to
+    :raises: :py:class:`odc.geo.crs.CRSMismatchError` when input CRSs differ.
+    """
+    geoms = list(geoms)
+    src_crs = common_crs(geoms)
+    if src_crs is None:
+        if len(geoms) == 0:
+            return []
+        raise ValueError("Cannot project geometries without CRS")
+
+    crs = norm_crs_or_error(crs)
+    if src_crs == crs:
+        return geoms
+
+    gg = numpy.empty(len(geoms), dtype=object)
+    gg[:] = [g.geom for g in geoms]
+    gg = shapely.transform(gg, _xy_transformer(src_crs, crs), include_z=_has_z(gg))
+    return [Geometry(g, crs) for g in gg]
+
+
 def common_crs(geoms: Iterable[Geometry]) -> Optional[CRS]:
     """
     Compute common CRS.
@@ -1082,24 +1221,33 @@ def clip_lon180(geom: Geometry, tol=1e-6) -> Geometry:
     """
     thresh = 180 - tol
 
-    def _clip_180(xx, clip):
-        return [x if abs(x) < thresh else clip for x in xx]
+    def _clip_xy(xy: numpy.ndarray) -> numpy.ndarray:
+        x = xy[:, 0]
+        keep = numpy.abs(x) < thresh
+        # majority vote of the points away from the discontinuity
+        cc = 2 * numpy.count_nonzero(x[keep] > 0) - numpy.count_nonzero(keep)
+        x[~keep] = 180 if cc >= 0 else -180
+        return xy
+
+    def _clip(g: Geometry) -> Geometry:
+        if g.geom_type == "Polygon":
+            # side of the discontinuity is picked per ring, not for the polygon as a whole
+            ext, *holes = (
+                shapely.transform(r, _clip_xy) for r in shapely.get_rings(g.geom)
+            )
+            return Geometry(shapely.Polygon(ext, holes), g.crs)
+        return Geometry(shapely.transform(g.geom, _clip_xy), g.crs)
 
-    def _pick_clip(xx: List[float]):
-        cc = 0
-        for x in xx:
-            if abs(x) < thresh:
-                cc += 1 if x > 0 else -1
-        return 180 if cc >= 0 else -180
+    if geom.geom_type.startswith("Multi"):
+        return multigeom(_clip(g) for g in geom.geoms)
 
-    def transformer(xx, yy):
-        clip = _pick_clip(xx)
-        return _clip_180(xx, clip), yy
+    return _clip(geom)
 
-    if geom.geom_type.startswith("Multi"):
-        return multigeom(g.transform(transformer) for g in geom.geoms)
 
-    return geom.transform(transformer)
+@functools.lru_cache(maxsize=64)
+def _antimeridian(crs: CRS, precision: float) -> Geometry:
+    # Geometry is immutable, so the projected line can be shared (and prepared) once
+    return projected_lon(crs, 180, step=precision).prepare()
 
 
 def chop_along_antimeridian(geom: Geometry, precision: float = 0.1) -> Geometry:
@@ -1114,8 +1262,8 @@ def chop_along_antimeridian(geom: Geometry, precision: float = 0.1) -> Geometry:
     if geom.crs is None:
         raise ValueError("Expect geometry with CRS defined")
 
-    l180 = projected_lon(geom.crs, 180, step=precision)
-    if geom.intersects(l180):
+    l180 = _antimeridian(geom.crs, precision)
+    if l180.intersects(geom):
         return multigeom(geom.split(l180))
 
     return geom
@@ -1212,7 +1360,8 @@ def box(
         (right, bottom),
         (left, bottom),
     ]
-    return polygon(points, crs=crs)
+    # construct directly, skipping GeoJSON parsing, but keep vertex order (unlike shapely.box)
+    return Geometry(shapely.polygons(numpy.asarray(points, dtype="float64")), crs=crs)
 
 
 def polygon_from_transform(
@@ -1239,10 +1388,14 @@ def sides(poly: Geometry) -> Iterable[Geometry]:
 
     One for each side of the exterior ring of the input polygon.
     """
-    XY = poly.exterior.points
+    XY = numpy.asarray(poly.exterior.points, dtype="float64")
     crs = poly.crs
-    for p1, p2 in zip(XY[:-1], XY[1:]):
-        yield line([p1, p2], crs)
+    if len(XY) < 2:
+        return
+
+    # (N, 2, 2) array of segment endpoints -> N LineStrings in one call
+    for g in shapely.linestrings(numpy.stack([XY[:-1], XY[1:]], axis=1)):
+        yield Geometry(g, crs)
 
 
 def _multigeom(geoms: List[base.BaseGeometry]) -> base.BaseGeometry:
@@ -1287,14 +1440,35 @@ def unary_union(geoms: Iterable[Geometry]) -> Optional[Geometry]:
         if crs != g.crs:
             raise CRSMismatchError((crs, g.crs))
 
-    return Geometry(ops.unary_union([g.geom for g in geoms]), crs)
+    gg = [g.geom for g in geoms]
+    # much cheaper than general union for disjoint inputs
+    if _HAVE_DISJOINT_UNION and len(gg) > 1 and _bbox_disjoint(gg):
+        # pylint: disable=no-member
+        return Geometry(shapely.disjoint_subset_union_all(gg), crs)
+
+    return Geometry(ops.unary_union(gg), crs)
+
+
+def _bbox_disjoint(geoms: List[base.BaseGeometry]) -> bool:
+    """Check that no two geometries have overlapping (or touching) bounding boxes."""
+    ii, jj = shapely.STRtree(geoms).query(geoms)
+    return len(ii) == len(geoms) and bool((ii == jj).all())
 
 
 def unary_intersection(geoms: Iterable[Geometry]) -> Geometry:
     """
     Compute intersection of multiple (multi)polygons.
     """
-    return functools.reduce(Geometry.intersection, geoms)
+    geoms = list(geoms)
+    if len(geoms) < 2:
+        return functools.reduce(Geometry.intersection, geoms)
+
+    crs = geoms[0].crs
+    for g in geoms[1:]:
+        if crs != g.crs:
+            raise CRSMismatchError((crs, g.crs))
+
+    return Geometry(shapely.intersection_all([g.geom for g in geoms]), crs)
 
 
 def triangulate(pts: Geometry, **kw) -> Geometry:
@@ -1333,26 +1507,19 @@ def bbox_union(bbs: Iterable[BoundingBox]) -> BoundingBox:
 
     Given a stream of bounding boxes compute enclosing :py:class:`~odc.geo.geom.BoundingBox`.
     """
-    # pylint: disable=invalid-name
-    try:
-        bb, *bbs = bbs
-    except ValueError:
-        raise ValueError("Union of empty stream is undefined") from None
-
-    L, B, R, T = bb
-    crs = bb.crs
+    bbs = list(bbs)
+    if len(bbs) == 0:
+        raise ValueError("Union of empty stream is undefined")
 
+    crs = bbs[0].crs
     for bb in bbs:
-        l, b, r, t = bb
-        L = min(l, L)
-        B = min(b, B)
-        R = max(r, R)
-        T = max(t, T)
-
         if crs != bb.crs:
             raise CRSMismatchError((crs, bb.crs))
 
-    return BoundingBox(L, B, R, T, crs)
+    xx = numpy.asarray([bb.bbox for bb in bbs])
+    left, bottom = xx[:, :2].min(axis=0).tolist()
+    right, top = xx[:, 2:].max(axis=0).tolist()
+    return BoundingBox(left, bottom, right, top, crs)
 
 
 def bbox_intersection(bbs: Iterable[BoundingBox]) -> BoundingBox:
@@ -372,16 +372,21 @@ def apply_affine(
     :param y: y coordinates (same shape as ``x``)
     :returns: Transformed coordinate as two arrays of the same shape as input ``(x', y')``
     """
+    # pylint: disable=invalid-name
+    a, b, c, d, e, f, *_ = A
+    dtype = np.result_type(x, y, np.float64)
 
-    shape = x.shape
+    # x' = a*x + b*y + c, y' = d*x + e*y + f, with one shared temporary
+    x_ = np.multiply(x, a, dtype=dtype)
+    y_ = np.multiply(x, d, dtype=dtype)
+    tmp = np.multiply(y, b, dtype=dtype)
+    x_ += tmp
+    np.multiply(y, e, out=tmp, dtype=dtype)
+    y_ += tmp
+    x_ += c
+    y_ += f
 
-    A = np.asarray(A).reshape(3, 3)
-    t = A[:2, -1].reshape((2, 1))
-    A = A[:2, :2]
-
-    x, y = A @ np.vstack([x.ravel(), y.ravel()]) + t
-    x, y = (a.reshape(shape) for a in (x, y))
-    return (x, y)
+    return (x_, y_)
 
 
 def split_translation(t: XY[float]) -> Tuple[XY[float], XY[float]]:
@@ -398,10 +403,9 @@ def split_translation(t: XY[float]) -> Tuple[XY[float], XY[float]]:
 
     :returns: ``(t_whole, t_subpix)``
     """
-    _tt = t.map(split_float)
-    whole = _tt.map(lambda x: x[0])
-    part = _tt.map(lambda x: x[1])
-    return whole, part
+    wx, px = split_float(t.x)
+    wy, py = split_float(t.y)
+    return xy_(wx, wy), xy_(px, py)
 
 
 def is_affine_st(A: Affine, tol: float = 1e-10) -> bool:
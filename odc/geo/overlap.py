@@ -135,7 +135,8 @@ class GbxPointTransform:
             xx = np.clip(xx, *range_x)
             yy = np.clip(yy, *range_y)
 
-        xx, yy = self._dst.wld2pix(*self._tr(xx, yy))
+        # xx, yy are temporaries owned by us, so transform them in place
+        xx, yy = self._dst.wld2pix(*self._tr(xx, yy, inplace=True))
         return [xy_(x, y) for x, y in zip(xx, yy)]
 
     def __repr__(self) -> str:
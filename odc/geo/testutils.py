@@ -68,6 +68,29 @@ def xy_from_gbox(gbox: GeoBox) -> Tuple[np.ndarray, np.ndarray]:
     return apply_affine(gbox.transform, xx, yy)
 
 
+def _norm_v(v: np.ndarray) -> Tuple[float, float]:
+    # in-place: v -> (v - v.min())*s, returns (s, offset)
+    vmin = v.min()
+    v -= vmin
+    s = 1.0 / v.max()
+    v *= s
+
+    return (s, -vmin * s)
+
+
+def _xy_pixel_centers(gbox: GeoBox, A: Affine) -> np.ndarray:
+    # 2xHxW float64 array of A*(x, y) for every pixel center of gbox
+    h, w = gbox.shape
+    a, b, c, d, e, f, *_ = A * gbox.transform
+    ii = np.arange(h, dtype="float64") + 0.5
+    jj = np.arange(w, dtype="float64") + 0.5
+
+    xy = np.empty((2, h, w), dtype="float64")
+    np.add.outer(ii * b + c, jj * a, out=xy[0])
+    np.add.outer(ii * e + f, jj * d, out=xy[1])
+    return xy
+
+
 def xy_norm(
     x: np.ndarray, y: np.ndarray, deg: float = 33.0
 ) -> Tuple[np.ndarray, np.ndarray, Affine]:
@@ -89,19 +112,11 @@ def xy_norm(
 
     """
 
-    def norm_v(v):
-        vmin = v.min()
-        v -= vmin
-        s = 1.0 / v.max()
-        v *= s
-
-        return (s, -vmin * s)
-
     A_rot = Affine.rotation(deg)
     x, y = apply_affine(A_rot, x, y)
 
-    sx, tx = norm_v(x)
-    sy, ty = norm_v(y)
+    sx, tx = _norm_v(x)
+    sy, ty = _norm_v(y)
 
     A = Affine(sx, 0, tx, 0, sy, ty) * A_rot
 
@@ -117,8 +132,9 @@ def to_fixed_point(a, dtype="uint16"):
     Reverse is provided by: ``from_fixed_point``
     """
     ii = np.iinfo(dtype)
-    a = a * ii.max + 0.5
-    a = np.clip(a, 0, ii.max, out=a)
+    a = np.multiply(a, ii.max)
+    a += 0.5
+    np.clip(a, 0, ii.max, out=a)
     return a.astype(ii.dtype)
 
 
@@ -129,7 +145,9 @@ def from_fixed_point(a):
     This is reverse of ``to_fixed_point``
     """
     ii = np.iinfo(a.dtype)
-    return a.astype("float64") * (1.0 / ii.max)
+    x = a.astype("float64")
+    x *= 1.0 / ii.max
+    return x
 
 
 def gen_test_image_xy(
@@ -152,13 +170,17 @@ def gen_test_image_xy(
     """
     dtype = np.dtype(dtype)
 
-    x, y = xy_from_gbox(gbox)
-    x, y, A = xy_norm(x, y, deg)
+    # Same as xy_norm(*xy_from_gbox(gbox), deg), but rotated pixel centers are
+    # computed straight into the output buffer and normalised in place
+    A_rot = Affine.rotation(deg)
+    xy = _xy_pixel_centers(gbox, A_rot)
 
-    xy = np.stack([x, y])
+    sx, tx = _norm_v(xy[0])
+    sy, ty = _norm_v(xy[1])
+    A = ~(Affine(sx, 0, tx, 0, sy, ty) * A_rot)
 
     if dtype.kind == "f":
-        xy = xy.astype(dtype)
+        xy = xy.astype(dtype, copy=False)
     else:
         xy = to_fixed_point(xy, dtype)
 
@@ -114,7 +114,9 @@ def rio_reproject(
     :param dst_nodata: Value to represent "no data" in the destination image
     :param       ydim: Which dimension is y-axis, next one must be x
 
-    :param     kwargs: any other args to pass to ``rasterio.warp.reproject``
+    :param     kwargs: any other args to pass to ``rasterio.warp.reproject``, for example
+                       ``num_threads=4`` to let GDAL warp with several threads, or
+                       ``warp_mem_limit`` (in MB) to warp in fewer chunks
 
     :returns: dst
     """
@@ -124,7 +126,12 @@ def rio_reproject(
     dst_nodata = resolve_nodata(dst_nodata, dst.dtype)
     fill_value = resolve_fill_value(dst_nodata, src_nodata, dst.dtype)
 
-    if src.ndim == 2:
+    if ydim is None:
+        # Assume last two dimensions are Y/X
+        ydim = src.ndim - 2
+
+    if src.ndim == 2 or (src.ndim == 3 and ydim == 1):
+        # YX or BYX: rasterio warps all bands in one go, sharing transformer setup
         return _rio_reproject(
             src,
             dst,
@@ -136,10 +143,6 @@ def rio_reproject(
             **kwargs,
         )
 
-    if ydim is None:
-        # Assume last two dimensions are Y/X
-        ydim = src.ndim - 2
-
     extra_dims = (*src.shape[:ydim], *src.shape[ydim + 2 :])
     # Selects each 2d plane in [...]YX[B] array
     slices: Iterable[Any] = (
@@ -171,7 +174,7 @@ def _rio_reproject(
     **kwargs,
 ) -> np.ndarray:
     assert src.ndim == dst.ndim
-    assert src.ndim == 2
+    assert src.ndim in (2, 3)  # YX or BYX
 
     if "XSCALE" not in kwargs and "YSCALE" not in kwargs:
         # Work around for issue in GDAL
@@ -1,6 +1,5 @@
 from pathlib import Path
 
-import numpy as np
 import pytest
 import xarray as xr
 
@@ -11,6 +10,25 @@ from odc.geo.xr import rasterize
 # pylint: disable=protected-access,import-outside-toplevel,redefined-outer-name
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runslow", action="store_true", default=False, help="run slow tests"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: slow test, only runs with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --runslow to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
 @pytest.fixture(scope="session")
 def data_dir():
     return Path(__file__).parent.joinpath("data")
@@ -55,11 +73,3 @@ def country(iso3, crs):
 def country_raster(country, resolution):
     geobox = GeoBox.from_geopolygon(country, resolution=resolution, tight=True)
     yield rasterize(country, geobox)
-
-
-@pytest.fixture()
-def country_raster_f32(country, resolution):
-    geobox = GeoBox.from_geopolygon(country, resolution=resolution, tight=True)
-    xx = rasterize(country, geobox)
-    xx = xr.where(xx, np.random.uniform(0, 100, xx.shape).astype("float32"), 0)
-    yield xx
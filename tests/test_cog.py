@@ -15,14 +15,23 @@ from rasterio import open as rio_open
 
 from odc.geo.cog import CogMeta, cog_gbox, save_cog_with_dask
 from odc.geo.cog._shared import compute_cog_spec, num_overviews
+from odc.geo.cog._stats import _stats_from_layer
+from odc.geo.cog._tiff_hdr import _hdr_layout, _overwrite_ascii_tag
 from odc.geo.cog._tifffile import (
     GEOTIFF_TAGS,
     _band_names,
+    _extract_tile_info,
     _gdal_sample_description,
     _gdal_sample_descriptions,
     _make_empty_cog,
+    _mk_tile_compressor,
     _norm_compression_tifffile,
-    _stats_from_layer,
+    _pad_tile,
+    _patch_hdr,
+    _render_gdal_metadata,
+    _tile_aligned,
+    _tile_to_block,
+    _tiles_per_task,
     geotiff_metadata,
 )
 from odc.geo.geobox import GeoBox
@@ -230,7 +239,7 @@ def test_empty_cog(shape, blocksize, expect_ax, dtype, compression, expect_predi
         blocksize=blocksize,
         compression=compression,
     )
-    assert isinstance(mm, memoryview)
+    assert isinstance(mm, bytes)
     assert meta.axis == expect_ax
     assert meta.dtype == dtype
     assert meta.shape[0] >= gbox.shape[0]
@@ -422,6 +431,115 @@ def test_gdal_sample_description(sample: int, description: str, expected: str):
     assert _gdal_sample_description(sample, description) == expected
 
 
+def test_tile_alignment():
+    assert _tile_aligned((256, 256, 100), 256)
+    assert _tile_aligned((512, 512, 300), 256)
+    assert _tile_aligned((100,), 256)
+    assert not _tile_aligned((100, 256), 256)
+    assert not _tile_aligned((384, 384), 256)
+
+    assert _tile_to_block((256, 100), 256) == [(0, 0), (1, 0)]
+    assert _tile_to_block((512, 300), 256) == [(0, 0), (0, 256), (1, 0), (1, 256)]
+
+
+@pytest.mark.parametrize("chunks", [(512, 512), (256, 1024), (1024, 1024)])
+def test_compress_tiles_no_rechunk(gbox: GeoBox, chunks):
+    gbox = gbox.zoom_to(1024)
+    img = xr_zeros(gbox, "int16", chunks=chunks)
+    rr = save_cog_with_dask(img, "", blocksize=[256, 128])
+    tiles = rr["tiles"][0]
+    assert not any(str(k).startswith("rechunk") for k in tiles.dask.layers)
+    assert tiles.npartitions == rr["meta"].num_tiles
+
+    img = xr_zeros(gbox, "int16", chunks=(100, 256))
+    rr = save_cog_with_dask(img, "", blocksize=[256, 128])
+    assert any(str(k).startswith("rechunk") for k in rr["tiles"][0].dask.layers)
+
+
+def test_compress_tiles_batched(gbox: GeoBox):
+    assert _tiles_per_task(1) == 1
+    assert _tiles_per_task(16) == 1
+    assert _tiles_per_task(100) == 6
+    assert _tiles_per_task(100_000) == 32
+
+    gbox = gbox.zoom_to(1024)
+    img = xr_zeros(gbox, "int16", chunks=512)
+    rr = save_cog_with_dask(img, "", blocksize=64)
+    tiles = rr["tiles"][0]
+    num_tiles = rr["meta"].num_tiles
+    assert tiles.npartitions == -(-num_tiles // _tiles_per_task(num_tiles))
+
+    idxs = [idx for _, idx in tiles.compute()]
+    assert len(idxs) == num_tiles
+    assert len(set(idxs)) == num_tiles
+
+
+def test_mk_tile_compressor(gbox: GeoBox):
+    meta, _ = _make_empty_cog((256, 256), "uint16", gbox, blocksize=128)
+    enc = _mk_tile_compressor(meta)
+    assert _mk_tile_compressor(meta) is enc
+
+    block = np.ones((100, 128), dtype="uint16")
+    assert isinstance(enc(block), bytes)
+
+    # NaN != NaN, but separately parsed NaN nodata still hits the cache
+    meta1, meta2 = (
+        _make_empty_cog((256, 256), "float32", gbox, blocksize=128, nodata="nan")[0]
+        for _ in range(2)
+    )
+    assert meta1.nodata is not meta2.nodata
+    assert _mk_tile_compressor(meta1) is _mk_tile_compressor(meta2)
+
+    # nested compression args are not hashable, but still work
+    meta, _ = _make_empty_cog(
+        (256, 256), "float32", gbox, blocksize=128, compression="LERC_DEFLATE", zlevel=6
+    )
+    assert meta.compressionargs["compressionargs"] == {"level": 6}
+    enc = _mk_tile_compressor(meta)
+    assert isinstance(enc(block.astype("float32")), bytes)
+
+
+def test_pad_tile():
+    block = np.arange(6, dtype="int16").reshape(2, 3)
+    assert _pad_tile(block, (2, 3), -1) is block
+
+    padded = _pad_tile(block, (4, 4), -1)
+    assert padded.dtype == block.dtype
+    np.testing.assert_array_equal(
+        padded, np.pad(block, ((0, 2), (0, 1)), constant_values=-1)
+    )
+
+    block = np.ones((3, 2, 4), dtype="uint8")
+    np.testing.assert_array_equal(
+        _pad_tile(block, (4, 4, 4), 0),
+        np.pad(block, ((0, 1), (0, 2), (0, 0))),
+    )
+
+
+def test_render_gdal_metadata():
+    assert _render_gdal_metadata(None) == "<GDALMetadata></GDALMetadata>"
+
+    stats = [{"mean": 1.5, "max": 2}, {"mean": 0.25, "max": 1}]
+    extra = ['<Item name="DESCRIPTION" sample="0" role="description">a</Item>']
+    assert _render_gdal_metadata(
+        stats, precision=2, eol="\n", gdal_metadata_extra=extra
+    ).split("\n") == [
+        "<GDALMetadata>",
+        '<Item name="STATISTICS_MEAN" sample="0">1.50</Item>',
+        '<Item name="STATISTICS_MAX" sample="0">2.00</Item>',
+        '<Item name="STATISTICS_MEAN" sample="1">0.25</Item>',
+        '<Item name="STATISTICS_MAX" sample="1">1.00</Item>',
+        *extra,
+        "</GDALMetadata>",
+    ]
+    assert _render_gdal_metadata(stats[0], precision=1, pad=5) == (
+        "<GDALMetadata>"
+        '<Item name="STATISTICS_MEAN" sample="0">  1.5</Item>'
+        '<Item name="STATISTICS_MAX" sample="0">  2.0</Item>'
+        "</GDALMetadata>"
+    )
+
+
 def test_gdal_sample_descriptions():
     assert _gdal_sample_descriptions(["red", "green", "blue"]) == [
         '<Item name="DESCRIPTION" sample="0" role="description">red</Item>',
@@ -515,6 +633,20 @@ def test_cog_with_dask_smoke_test(gbox: GeoBox, tmp_path: Path, dtype):
         save_cog_with_dask(img, fname, compression="deflate", level=2)
 
 
+def test_cog_with_dask_uncompressed(gbox: GeoBox, tmp_path: Path):
+    gbox = gbox.zoom_to(500)
+    img = xr_zeros(gbox, "uint16", chunks=(256, 256))
+    img.data = img.data + da.arange(500, dtype="uint16", chunks=256)
+
+    fname = str(tmp_path / "cog-none.tif")
+    rr = save_cog_with_dask(img, fname, compression="none").compute()
+    assert str(rr) == fname
+
+    with rio_open(fname) as src:
+        assert src.compression is None
+        np.testing.assert_array_equal(src.read(1)[:500, :500], img.values)
+
+
 @pytest.mark.parametrize(
     ("array", "nodata", "minimum", "maximum", "mean", "stddev", "valid_percent"),
     [
@@ -571,3 +703,141 @@ def test_stats_from_layer(array, nodata, minimum, maximum, mean, stddev, valid_p
     assert stats["stddev"] == stddev
     assert stats["valid_percent"] == valid_percent
     assert stats["valid_percent"] == valid_percent
+
+
+@pytest.mark.parametrize("yaxis", [0, 1])
+def test_stats_from_layer_chunked(yaxis):
+    rng = np.random.default_rng(3)
+    shape = (3, 100, 70) if yaxis else (100, 70, 3)
+    xx = rng.normal(1e4, 1, size=shape)
+    xx[rng.random(shape) < 0.2] = -1
+    xx[rng.random(shape) < 0.1] = np.nan
+    x = da.from_array(xx, chunks=(1, 30, 32) if yaxis else (30, 32, 2))
+
+    stats = _stats_from_layer(x, -1, yaxis=yaxis).compute()
+    assert len(stats) == 3
+
+    axis = (yaxis, yaxis + 1)
+    mm = np.ma.masked_where((xx == -1) | ~np.isfinite(xx), xx)
+    for k, expect in [
+        ("minimum", mm.min(axis=axis)),
+        ("maximum", mm.max(axis=axis)),
+        ("mean", mm.mean(axis=axis)),
+        ("stddev", mm.std(axis=axis)),
+        ("valid_percent", mm.count(axis=axis) * (100 / (100 * 70))),
+    ]:
+        np.testing.assert_allclose([s[k] for s in stats], expect)
+
+
+def test_extract_tile_info(gbox: GeoBox):
+    gbox = gbox.zoom_to((1000, 700))
+    meta, _ = _make_empty_cog((3, *gbox.shape), "uint8", gbox, blocksize=256)
+    tiles = [(*idx, 0 if idx[-1] == 0 else 10 + sum(idx)) for idx in meta.cog_tidx()]
+
+    tile_info = _extract_tile_info(meta, tiles, 100)
+    assert len(tile_info) == len(meta.flatten())
+
+    offset = 100
+    for scale_idx, p, y, x, sz in tiles:
+        b_offsets, b_lengths = tile_info[scale_idx]
+        tidx = meta.flatten()[scale_idx].flat_tile_idx((p, y, x))
+        assert b_lengths[tidx] == sz
+        assert b_offsets[tidx] == (offset if sz else 0)
+        offset += sz
+
+    assert _extract_tile_info(meta, [], 0) == [
+        ([0] * m.num_tiles, [0] * m.num_tiles) for m in meta.flatten()
+    ]
+    with pytest.raises(IndexError):
+        _extract_tile_info(meta, [(0, 0, 100, 0, 1)])
+    with pytest.raises(IndexError):
+        _extract_tile_info(meta, [(len(meta.flatten()), 0, 0, 0, 1)])
+
+
+def _patch_hdr_tifffile(tiles, meta, hdr0, stats=None, gdal_metadata_extra=None):
+    # reference: rewrite header tags with tifffile's TiffTag.overwrite
+    tifffile = pytest.importorskip("tifffile")
+
+    tile_info = _extract_tile_info(meta, [(*idx, sz) for sz, idx in tiles], 0)
+    bio = BytesIO(hdr0)
+    with tifffile.TiffFile(bio, mode="r+", name=":mem:") as tr:
+        if stats is not None or gdal_metadata_extra:
+            tr.pages.first.tags[42112].overwrite(
+                _render_gdal_metadata(
+                    stats, precision=6, gdal_metadata_extra=gdal_metadata_extra
+                )
+            )
+        hdr_sz = len(bio.getbuffer())
+        for (offsets, lengths), page in zip(tile_info, tr.pages):
+            page.tags[324].overwrite([off + hdr_sz for off in offsets])
+            page.tags[325].overwrite(lengths)
+    return bytes(bio.getbuffer())
+
+
+@pytest.mark.parametrize("bigtiff", [True, False])
+@pytest.mark.parametrize("shape", [(500, 300), (300, 500, 3)])
+@pytest.mark.parametrize("blocksize", [128, 256])
+@pytest.mark.parametrize(
+    "with_stats, extra", [(False, None), (True, None), (True, ["<Item>x</Item>"])]
+)
+def test_patch_hdr_matches_tifffile(
+    gbox: GeoBox, bigtiff: bool, shape, blocksize: int, with_stats: bool, extra
+):
+    gbox = gbox.zoom_to(shape[:2])
+    meta, hdr0 = _make_empty_cog(
+        shape,
+        "uint16",
+        gbox,
+        blocksize=blocksize,
+        bigtiff=bigtiff,
+        gdal_metadata="" if with_stats else None,
+    )
+    nb = 1 if len(shape) == 2 else shape[2]
+    stats = None
+    if with_stats:
+        stats = [
+            dict(minimum=0, maximum=b, mean=b / 2, stddev=0.5, valid_percent=99)
+            for b in range(nb)
+        ]
+    tiles = [(100 + 7 * sum(idx), idx) for idx in meta.cog_tidx()]
+
+    expect = _patch_hdr_tifffile(tiles, meta, hdr0, stats, extra)
+    assert _patch_hdr(tiles, meta, hdr0, stats, extra) == expect
+    assert (
+        _patch_hdr(tiles, meta, hdr0, stats, extra, layout=_hdr_layout(hdr0)) == expect
+    )
+
+
+@pytest.mark.parametrize("bigtiff", [True, False])
+def test_patch_hdr(gbox: GeoBox, bigtiff: bool):
+    tifffile = pytest.importorskip("tifffile")
+    gbox = gbox.zoom_to((500, 300))
+    meta, hdr0 = _make_empty_cog(
+        gbox.shape, "uint8", gbox, blocksize=128, bigtiff=bigtiff, gdal_metadata=""
+    )
+    layout = _hdr_layout(hdr0)
+    assert layout.bigtiff is bigtiff
+    assert len(layout.tile_tags) == len(meta.flatten())
+
+    tiles = [(10 + sum(idx), idx) for idx in meta.cog_tidx()]
+    stats = [dict(minimum=0, maximum=1, mean=0.5, stddev=0.5, valid_percent=100)]
+    hdr = _patch_hdr(tiles, meta, hdr0, stats, layout=layout)
+    assert _patch_hdr(tiles, meta, bytes(hdr0), stats) == hdr
+
+    with tifffile.TiffFile(BytesIO(hdr)) as tr:
+        assert "STATISTICS_MEAN" in tr.pages.first.tags[42112].value
+        for sz, (scale_idx, *idx) in tiles:
+            tags = tr.pages[scale_idx].tags
+            tidx = meta.flatten()[scale_idx].flat_tile_idx(tuple(idx))
+            assert np.atleast_1d(tags[325].value)[tidx] == sz
+            assert np.atleast_1d(tags[324].value)[tidx] >= len(hdr)
+
+    # shorter value is written in place, tiny value goes inline
+    for value, grows in [("x" * 1000, True), ("y" * 100, False), ("z", False)]:
+        layout = _hdr_layout(hdr)
+        buf = bytearray(hdr)
+        _overwrite_ascii_tag(buf, layout, layout.md_tag, value)
+        assert (len(buf) > len(hdr)) is grows
+        with tifffile.TiffFile(BytesIO(buf)) as tr:
+            assert tr.pages.first.tags[42112].value == value
+        hdr = bytes(buf)
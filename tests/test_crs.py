@@ -16,6 +16,7 @@ from odc.geo.crs import (
     CRS,
     CRSError,
     CRSMismatchError,
+    _make_crs_transform,
     crs_units_per_degree,
     norm_crs,
     norm_crs_or_error,
@@ -328,3 +329,12 @@ def test_crs_units_issue_120():
                 LENGTHUNIT["metre",1]],
         ID["EPSG",5829]]]"""
     assert CRS(compound_crs_wkt).units == ("metre", "metre")
+
+
+def test_transformer_cache():
+    a, b = CRS("epsg:3857"), CRS("EPSG:4326")
+    # pylint: disable=protected-access
+    tr = _make_crs_transform(a._crs, b._crs, True)
+    assert _make_crs_transform(CRS(3857)._crs, CRS(4326)._crs, True) is tr
+    assert _make_crs_transform(a._crs, b._crs, False) is not tr
+    assert _make_crs_transform(b._crs, a._crs, True) is not tr
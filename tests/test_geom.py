@@ -7,8 +7,11 @@ import pickle
 
 import numpy as np
 import pytest
+import shapely
 from affine import Affine
+from pyproj.transformer import Transformer
 from pytest import approx
+from shapely import ops
 
 from odc.geo._interop import have
 from odc.geo import CRS, CRSMismatchError, geom, wh_
@@ -18,6 +21,7 @@ from odc.geo.geom import (
     clip_lon180,
     densify,
     force_2d,
+    geoms_to_crs,
     multigeom,
     projected_lon,
     triangulate,
@@ -59,6 +63,9 @@ def test_props():
     triangle = geom.polygon([(10, 20), (20, 20), (20, 10), (10, 20)], crs=crs)
     assert triangle.boundingbox == geom.BoundingBox(10, 10, 20, 20, crs)
     assert triangle.envelope.contains(triangle)
+    # derived values are computed once
+    assert triangle.boundingbox is triangle.boundingbox
+    assert triangle.envelope is triangle.envelope
 
     assert box1.length == 80.0
 
@@ -92,13 +99,17 @@ def test_props():
         geom.Geometry(object())
 
 
-def test_tests():
+@pytest.mark.parametrize("prepare", [False, True])
+def test_tests(prepare: bool):
     box1 = geom.box(10, 10, 30, 30, crs=epsg4326)
     box2 = geom.box(20, 10, 40, 30, crs=epsg4326)
     box3 = geom.box(30, 10, 50, 30, crs=epsg4326)
     box4 = geom.box(40, 10, 60, 30, crs=epsg4326)
     minibox = geom.box(15, 15, 25, 25, crs=epsg4326)
 
+    if prepare:
+        assert box1.prepare() is box1
+
     assert not box1.touches(box2)
     assert box1.touches(box3)
     assert not box1.touches(box4)
@@ -241,6 +252,19 @@ def test_ops():
         lambda x, y: (x + 1, y + 2)
     ) == geom.point(1, 2, epsg4326)
 
+    tr = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
+    for g in (geom.point(3, 4, epsg4326), geom.box(1, 2, 11, 22, epsg4326)):
+        g_ = g.transform(tr, crs=epsg3857)
+        assert g_.crs == epsg3857
+        assert g_.geom.equals_exact(g.to_crs(epsg3857).geom, 1e-6)
+
+    # 3d: x, y are transformed, z is kept as is
+    g = geom.Geometry(shapely.LineString([(3, 4, 5), (6, 7, 8)]), epsg4326)
+    g_ = g.transform(tr, crs=epsg3857)
+    assert [xyz[2] for xyz in g_.coords] == [5, 8]
+    assert g_.geom.equals_exact(g.to_crs(epsg3857).geom, 1e-6)
+    assert g.transform(Affine.translation(1, 2)).coords == [(4, 6, 5), (7, 9, 8)]
+
     # test sides
     box = geom.box(1, 2, 11, 22, epsg4326)
     lines = list(geom.sides(box))
@@ -263,6 +287,20 @@ def test_geom_split():
     with pytest.raises(CRSMismatchError):
         list(box.split(geom.line([(5, 0), (5, 30)], epsg3857)))
 
+    # many-part multipolygon: only parts hit by the line are split, order is kept
+    mp = multigeom(
+        [
+            geom.box(i * 2, j * 2, i * 2 + 1, j * 2 + 1, epsg4326)
+            for i in range(5)
+            for j in range(5)
+        ]
+    )
+    line = geom.line([(4.5, -1), (4.5, 11)], epsg4326)
+    bb = list(mp.split(line))
+    expect = [geom.Geometry(g, epsg4326) for g in ops.split(mp.geom, line.geom).geoms]
+    assert len(bb) == len(expect) == 30
+    assert all(a.geom.equals(b.geom) for a, b in zip(bb, expect))
+
 
 def test_multigeom():
     p1, p2 = (0, 0), (1, 2)
@@ -368,6 +406,52 @@ def test_to_crs():
         poly.to_crs(epsg3857)
 
 
+def test_geoms_to_crs():
+    gg = [
+        geom.polygon([(0, 0), (0, 5), (10, 5)], epsg4326),
+        geom.point(3, 4, epsg4326),
+        geom.box(0, 0, 1, 3, epsg4326) | geom.box(2, 4, 3, 6, epsg4326),
+    ]
+    gg_ = geoms_to_crs(gg, "epsg:3857")
+    assert len(gg_) == len(gg)
+    for g, g_ in zip(gg, gg_):
+        assert g_.crs == epsg3857
+        assert g_.geom_type == g.geom_type
+        assert g_.geom.equals_exact(g.to_crs(epsg3857).geom, 1e-6)
+
+    assert geoms_to_crs([], epsg3857) == []
+    assert geoms_to_crs(gg, epsg4326) == gg
+
+    with pytest.raises(CRSMismatchError):
+        geoms_to_crs([gg[0], gg[1].to_crs(epsg3857)], epsg3577)
+
+    with pytest.raises(ValueError):
+        geoms_to_crs([geom.point(3, 4, None)], epsg3857)
+
+
+def test_to_crs_3d():
+    pts = [(0, 0, 10), (0, 5, 20), (10, 5, 30)]
+    g = geom.Geometry(shapely.Polygon(pts), epsg4326)
+    assert g.geom.has_z
+
+    g_ = g.to_crs(epsg3857)
+    xy_expect = geom.polygon([xyz[:2] for xyz in pts], epsg4326).to_crs(epsg3857)
+    assert g_.geom.has_z
+    for xyz, xy in zip(g_.exterior.coords, xy_expect.exterior.coords):
+        assert xyz[:2] == approx(xy)
+    # only x, y are projected, z is passed through as is
+    assert [xyz[2] for xyz in g_.exterior.coords] == [10, 20, 30, 10]
+
+    # single vertex, mixed 2d and 3d inputs
+    p2 = geom.point(3, 4, epsg4326)
+    p3 = geom.Geometry(shapely.Point(3, 4, 7), epsg4326)
+    p3_, p2_ = geoms_to_crs([p3, p2], epsg3857)
+    assert p3_.geom.has_z and not p2_.geom.has_z
+    assert p3_.coords[0][:2] == approx(p2_.coords[0])
+    assert p3_.coords[0][2] == 7
+    assert p3.to_crs(epsg3857).coords == p3_.coords
+
+
 def test_to_crs_with_check():
     crs = "+proj=ortho +lat0=40"
     gg = geom.line([[-180, 0], [180, 0]], 4326).segmented(5)
@@ -398,6 +482,34 @@ def test_densify():
     assert densify(s_x10, 5) == [(0, 0), (5, 0), (10, 0)]
     assert densify(s_x10, 4) == [(0, 0), (4, 0), (8, 0), (10, 0)]
 
+    # length is what matters, not the x coordinate
+    assert densify([(0, 0), (0, 10)], 4) == [(0, 0), (0, 4), (0, 8), (0, 10)]
+    assert densify([(0, 0), (0, 10), (3, 14)], 5) == [
+        (0, 0),
+        (0, 5),
+        (0, 10),
+        (3, 14),
+    ]
+    assert densify([(1, 1), (1, 1)], 0) == [(1, 1), (1, 1)]
+    assert densify([(1, 1)], 1) == [(1, 1)]
+
+    # same output type whether points are added or not
+    for coords, resolution in [
+        ([(0, 0), (0, 10)], 4),
+        ([(0, 0), (0, 10)], 20),
+        ([(0, 0), (0, 10)], 0),
+        ([(0, 0), (0, 10)], -1),
+        ([[1, 1]], 1),
+    ]:
+        out = densify(coords, resolution)
+        assert all(isinstance(pt, tuple) for pt in out)
+        assert all(isinstance(v, float) for pt in out for v in pt)
+
+    # no points added for non-positive resolution
+    assert densify([(0, 0), (0, 10)], 0) == [(0, 0), (0, 10)]
+    assert densify([(0, 0), (0, 10)], -1) == [(0, 0), (0, 10)]
+    assert densify([], 1) == []
+
 
 def test_unary_union():
     box1 = geom.box(10, 10, 30, 30, crs=epsg4326)
@@ -430,6 +542,67 @@ def test_unary_union():
         geom.unary_union([box1, box1.to_crs(epsg3577)])
 
 
+def test_unary_union_disjoint(monkeypatch):
+    calls = []
+
+    def _union_disjoint(geoms):
+        calls.append(len(geoms))
+        return shapely.union_all(geoms)
+
+    # shapely>=2.1 only, fake it so the fast path runs on older versions too
+    monkeypatch.setattr(geom, "_HAVE_DISJOINT_UNION", True)
+    monkeypatch.setattr(
+        shapely, "disjoint_subset_union_all", _union_disjoint, raising=False
+    )
+
+    box1 = geom.box(10, 10, 30, 30, crs=epsg4326)
+    box2 = geom.box(20, 10, 40, 30, crs=epsg4326)
+    box4 = geom.box(40, 10, 60, 30, crs=epsg4326)
+
+    union = geom.unary_union([box1, box4])
+    assert calls == [2]
+    assert union.crs == epsg4326
+    assert union.geom_type == "MultiPolygon"
+    assert union.area == 2.0 * box1.area
+
+    # overlapping inputs and single geometries take the general path
+    assert geom.unary_union([box1, box2]).area == 1.5 * box1.area
+    assert geom.unary_union([box1]) == box1
+    assert calls == [2]
+
+
+@pytest.mark.skipif(
+    not geom._HAVE_DISJOINT_UNION, reason="needs shapely>=2.1 and GEOS>=3.12"
+)
+def test_unary_union_disjoint_native(monkeypatch):
+    native = shapely.disjoint_subset_union_all
+    calls = []
+
+    def _spy(geoms):
+        calls.append(len(geoms))
+        return native(geoms)
+
+    monkeypatch.setattr(shapely, "disjoint_subset_union_all", _spy)
+
+    boxes = [geom.box(x, 10, x + 20, 30, crs=epsg4326) for x in (10, 40, 70)]
+    union = geom.unary_union(boxes)
+    assert calls == [3]
+    assert union.crs == epsg4326
+    assert union.geom_type == "MultiPolygon"
+    assert union.area == 3 * boxes[0].area
+    assert union.geom.equals(shapely.union_all([b.geom for b in boxes]))
+
+
+def test_bbox_disjoint():
+    def _box(*bbox):
+        return geom.box(*bbox, None).geom
+
+    assert geom._bbox_disjoint([_box(10, 10, 30, 30), _box(40, 10, 60, 30)])
+    assert not geom._bbox_disjoint([_box(10, 10, 30, 30), _box(30, 10, 50, 30)])
+    assert not geom._bbox_disjoint([_box(10, 10, 30, 30), _box(20, 10, 40, 30)])
+    assert not geom._bbox_disjoint([_box(10, 10, 30, 30), shapely.Polygon()])
+
+
 def test_unary_intersection():
     box1 = geom.box(10, 10, 30, 30, crs=epsg4326)
     box2 = geom.box(15, 10, 35, 30, crs=epsg4326)
@@ -464,6 +637,10 @@ def test_unary_intersection():
     assert not bool(inter6)
     assert inter6.is_empty
 
+    with pytest.raises(CRSMismatchError) as e:
+        geom.unary_intersection([box1, box2, box3.to_crs(epsg3577)])
+    assert e.value.args[0] == (epsg4326, epsg3577)
+
 
 def test_gen_test_image_xy():
     gbox = GeoBox(wh_(3, 7), Affine.translation(10, 1000), epsg3857)
@@ -588,6 +765,18 @@ def test_clip_lon180():
     assert bb_[0] == b(180)
     assert bb_[1] == b_neg(-180)
 
+    # holes touching the antimeridian are clipped too, each ring on its own
+    def with_hole(lside, hx):
+        hole = [(hx, 2), (-179, 5), (hx, 8), (hx, 2)]
+        return geom.polygon(list(b_neg(lside).exterior.coords), epsg4326, hole)
+
+    for lside, hx in [
+        (180 - err, 180 - err),
+        (-180 + err, 180 - err),
+        (180 - err, -180),
+    ]:
+        assert clip_lon180(with_hole(lside, hx)) == with_hole(-180, -180)
+
 
 def test_wrap_dateline():
     albers_crs = epsg3577
@@ -742,6 +931,15 @@ def test_point_transformer():
     assert np.isnan(x_).all()
     assert np.isnan(y_).all()
 
+    # pre-allocated output buffers, inputs are left untouched
+    out = (np.empty(len(pts)), np.empty(len(pts)))
+    x_in = np.asarray(x_expect)
+    xb, yb = tr_back(x_in, y_expect, out=out)
+    assert xb is out[0] and yb is out[1]
+    np.testing.assert_array_almost_equal(xb, [pt[0] for pt in pts])
+    np.testing.assert_array_almost_equal(yb, [pt[1] for pt in pts])
+    np.testing.assert_array_equal(x_in, x_expect)
+
 
 def test_base_internals():
     no_epsg_crs = CRS(SAMPLE_WKT_WITHOUT_AUTHORITY)
@@ -750,6 +948,15 @@ def test_base_internals():
     gjson_bad = {"type": "a", "coordinates": [1, [2, 3, 4]]}
     assert force_2d(gjson_bad) == {"type": "a", "coordinates": [1, [2, 3]]}
 
+    # rectangular numeric input comes back as lists, mixed int/float as float
+    gjson = {"type": "LineString", "coordinates": ((0, 1, 2), (3.5, 4, 5))}
+    coords = force_2d(gjson)["coordinates"]
+    assert coords == [[0.0, 1.0], [3.5, 4.0]]
+    assert all(isinstance(pt, list) for pt in coords)
+    assert all(isinstance(v, float) for pt in coords for v in pt)
+    pt = force_2d({"type": "Point", "coordinates": (1, 2, 3)})
+    assert pt["coordinates"] == [1, 2]
+
     with pytest.raises(ValueError):
         force_2d({"type": "a", "coordinates": [set("not a valid element")]})
 
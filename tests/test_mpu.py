@@ -4,7 +4,7 @@ from typing import Any, Dict, List, Tuple
 import numpy as np
 import pytest
 
-from odc.geo.cog._mpu import MPUChunk, SomeData, mpu_write
+from odc.geo.cog._mpu import MPUChunk, SomeData, default_spill_sz, mpu_write
 
 FakeWriteResult = Tuple[int, SomeData, Dict[str, Any]]
 # pylint: disable=unbalanced-tuple-unpacking,redefined-outer-name,import-outside-toplevel
@@ -61,6 +61,21 @@ class FakeWriter:
         return self
 
 
+class FakePutWriter(FakeWriter):
+    """
+    Fake writer that supports single-shot upload of small outputs.
+    """
+
+    def __init__(self, put_limit: int, **limits) -> None:
+        super().__init__(**limits)
+        self.put_limit = put_limit
+        self.puts: List[SomeData] = []
+
+    def put(self, data: SomeData) -> Dict[str, Any]:
+        self.puts.append(bytes(data))
+        return {"Put": etag(data), "Writer": self}
+
+
 def etag(data):
     return f'"{md5(data).hexdigest()}"'
 
@@ -395,3 +410,38 @@ def test_dask_parts(spill_sz: int):
     assert rr.data == data
     assert rr.started_write is False
     assert rr.parts == []
+
+
+def test_default_spill_sz(monkeypatch):
+    monkeypatch.delenv("ODC_MPU_SPILL_SZ", raising=False)
+    assert default_spill_sz() == _mb(20)
+    assert default_spill_sz(_mb(8)) == _mb(8)
+
+    monkeypatch.setenv("ODC_MPU_SPILL_SZ", str(_mb(6)))
+    assert default_spill_sz() == _mb(6)
+    assert default_spill_sz(_mb(8)) == _mb(6)
+
+    monkeypatch.setenv("ODC_MPU_SPILL_SZ", "20MB")
+    with pytest.raises(ValueError, match="ODC_MPU_SPILL_SZ"):
+        default_spill_sz()
+
+
+@pytest.mark.parametrize("put_limit", [0, 1000])
+def test_dask_put(put_limit: int):
+    pytest.importorskip("dask")
+    from dask import bag
+
+    write = FakePutWriter(put_limit, min_write_sz=10)
+    data = _mk_fake_data(103)
+    parts = [(bb, idx) for idx, bb in enumerate(_split(data, [30, 50]))]
+    chunks = bag.from_sequence(parts, npartitions=len(parts))
+
+    rr = mpu_write(chunks, write, spill_sz=10_000).compute()
+    assert rr["Writer"] is write
+    if put_limit >= len(data):
+        assert write.puts == [data]
+        assert write.raw_parts == []
+    else:
+        assert write.puts == []
+        assert rr["Parts"] == write.parts
+        assert write.data == data
@@ -1,9 +1,127 @@
-from odc.geo.cog._s3 import MultiPartUpload
+import pickle
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cachetools import LRUCache
+
+from odc.geo.cog._s3 import MultiPartUpload, _as_body, _s3_client
 
 # TODO: moto
+# pylint: disable=protected-access
 
 
 def test_s3_mpu():
     mpu = MultiPartUpload("bucket", "file.dat")
     assert mpu.bucket == "bucket"
     assert mpu.key == "file.dat"
+
+
+def test_s3_client_shared():
+    pytest.importorskip("botocore")
+
+    endpoint_url = "http://localhost:9000"
+    a = MultiPartUpload("bucket", "a.dat", endpoint_url=endpoint_url)
+    b = MultiPartUpload("bucket", "b.dat", endpoint_url=endpoint_url)
+    b = pickle.loads(pickle.dumps(b))
+    c = MultiPartUpload("bucket", "c.dat", endpoint_url="http://localhost:9001")
+
+    assert a.s3_client() is a.s3_client()
+    assert a.s3_client() is b.s3_client()
+    assert a.s3_client() is not c.s3_client()
+
+
+def test_s3_client_cache_key():
+    pytest.importorskip("botocore")
+    from botocore.credentials import ReadOnlyCredentials
+
+    creds = ReadOnlyCredentials("fake-key", "fake-secret", "fake-token")
+    a = MultiPartUpload("bucket", "a.dat", creds=creds)
+    assert a.s3_client() is a.s3_client()
+
+    # secrets are not part of the cache key
+    for key in _s3_client.cache:
+        assert "fake-secret" not in key
+        assert "fake-token" not in key
+
+    # bounded, rotating credentials evict old clients
+    assert isinstance(_s3_client.cache, LRUCache)
+    assert len(_s3_client.cache) <= _s3_client.cache.maxsize
+
+
+def test_s3_creds_factory():
+    pytest.importorskip("botocore")
+    from botocore.credentials import ReadOnlyCredentials
+
+    calls = []
+
+    def creds():
+        calls.append(1)
+        return ReadOnlyCredentials("fake-key", "fake-secret", None)
+
+    mpu = MultiPartUpload("bucket", "file.dat", creds=creds)
+    assert calls == []
+    s3 = mpu.s3_client()
+    assert calls == [1]
+    assert s3._request_signer._credentials.access_key == "fake-key"
+    assert mpu.s3_client() is s3
+    assert calls == [1]
+
+
+def test_s3_creds_factory_pickled():
+    pytest.importorskip("botocore")
+    cloudpickle = pytest.importorskip("cloudpickle")
+    from botocore.credentials import ReadOnlyCredentials
+
+    secret = "fake-secret"
+
+    def creds():
+        return ReadOnlyCredentials("fake-key", secret, None)
+
+    a = MultiPartUpload("bucket", "a.dat", creds=creds, creds_key="test-pickled")
+    b, c = (cloudpickle.loads(cloudpickle.dumps(a)) for _ in range(2))
+    assert b.creds is not c.creds
+    assert a.s3_client() is b.s3_client()
+    assert b.s3_client() is c.s3_client()
+
+    d = MultiPartUpload("bucket", "d.dat", creds=creds, creds_key="test-other")
+    assert d.s3_client() is not a.s3_client()
+
+
+def test_s3_creds_factory_refresh():
+    pytest.importorskip("botocore")
+
+    calls = []
+
+    def creds():
+        calls.append(1)
+        # first credentials are inside botocore's advisory refresh window
+        ttl = timedelta(minutes=11 if len(calls) == 1 else 120)
+        return {
+            "access_key": f"key-{len(calls)}",
+            "secret_key": "fake-secret",
+            "token": "fake-token",
+            "expiry_time": (datetime.now(timezone.utc) + ttl).isoformat(),
+        }
+
+    mpu = MultiPartUpload("bucket", "file.dat", creds=creds, creds_key="test-refresh")
+    s3 = mpu.s3_client()
+    assert calls == [1]
+    assert s3._request_signer._credentials.access_key == "key-2"
+    assert s3._request_signer._credentials.access_key == "key-2"
+    assert calls == [1, 1]
+
+
+def test_s3_body_no_copy():
+    data = bytearray(b"0123456789")
+    assert _as_body(data) is data
+    assert _as_body(b"abc") == b"abc"
+
+    body = _as_body(memoryview(data)[2:8])
+    assert body.seekable()
+    assert body.read(3) == b"234"
+    assert body.tell() == 3
+    assert body.read() == b"567"
+    assert body.seek(0) == 0
+    assert body.read() == b"234567"
+    assert body.seek(-2, 2) == 4
+    assert body.read() == b"67"